@@ -0,0 +1,247 @@
+"""
+Approximate nearest-neighbour search (IVF) over the argument vector store.
+
+The index is an inverted file: a spherical k-means coarse quantizer splits the
+normalized corpus into `n_lists` clusters, and a query only scores the rows of
+its `nprobe` closest clusters. Raising `nprobe` trades latency for recall;
+`nprobe == n_lists` is exact search.
+
+Build it offline next to the vector store, then measure recall@k against exact
+search to pick an nprobe:
+    python ann_index.py build [n_lists]
+    python ann_index.py eval [k]
+"""
+
+import json
+import sys
+import time
+
+import numpy as np
+
+from vector_store import (
+    DATABASE_FILE,
+    MODEL_NAME_EMBED,
+    VectorStore,
+    StaleIndexError,
+    normalize_rows,
+    top_k_indices,
+)
+
+IVF_INDEX_FILE = "arguments_embeddings.ivf.npz"
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 20
+KMEANS_MAX_TRAINING_ROWS = 50_000
+ASSIGN_CHUNK_ROWS = 16_384
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Returns the nearest (max dot product) centroid for each row, in chunks."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        chunk = np.asarray(vectors[start : start + ASSIGN_CHUNK_ROWS])
+        assignments[start : start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def train_kmeans(vectors: np.ndarray, n_lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of normalized rows; returns the centroids."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), max(n_lists, KMEANS_MAX_TRAINING_ROWS))
+    sample_rows = np.sort(rng.choice(len(vectors), size=sample_size, replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=n_lists)
+        # Re-seed empty clusters with random sample rows so no list is wasted.
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index: centroids plus row ids grouped by cluster."""
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        row_ids: np.ndarray,
+        offsets: np.ndarray,
+        meta: dict,
+    ):
+        self.centroids = centroids
+        self.row_ids = row_ids
+        self.offsets = offsets
+        self.meta = meta
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(
+        cls, store: VectorStore, n_lists: int = None, seed: int = 0
+    ) -> "IVFIndex":
+        """Clusters the store's vectors. Defaults to ~4 * sqrt(N) lists."""
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(store.row_count))
+        n_lists = max(1, min(n_lists, store.row_count))
+        centroids = train_kmeans(store.vectors, n_lists, seed=seed)
+        assignments = _assign(store.vectors, centroids)
+        row_ids = np.argsort(assignments, kind="stable").astype(np.int64)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=n_lists))
+        meta = {
+            "model_name": store.manifest["model_name"],
+            "database_sha256": store.manifest["database_sha256"],
+            "row_count": store.row_count,
+        }
+        return cls(centroids, row_ids, offsets, meta)
+
+    def save(self, path: str = IVF_INDEX_FILE):
+        np.savez(
+            path,
+            centroids=self.centroids,
+            row_ids=self.row_ids,
+            offsets=self.offsets,
+            meta=np.array(json.dumps(self.meta)),
+        )
+
+    @classmethod
+    def load(cls, store: VectorStore, path: str = IVF_INDEX_FILE) -> "IVFIndex":
+        """
+        Loads an index and checks it was built from `store`.
+
+        Raises:
+            FileNotFoundError: If the index has not been built.
+            StaleIndexError: If the store has been rebuilt since.
+        """
+        with np.load(path) as data:
+            index = cls(
+                data["centroids"],
+                data["row_ids"],
+                data["offsets"],
+                json.loads(str(data["meta"])),
+            )
+        if (
+            index.meta.get("database_sha256") != store.manifest["database_sha256"]
+            or index.meta.get("row_count") != store.row_count
+        ):
+            raise StaleIndexError(
+                f"IVF index '{path}' was built from a different vector store. Rebuild it."
+            )
+        return index
+
+    def search(
+        self,
+        store: VectorStore,
+        query_embeddings: np.ndarray,
+        top_n: int = 5,
+        nprobe: int = DEFAULT_NPROBE,
+    ):
+        """
+        Scores each query against the rows of its `nprobe` nearest lists.
+
+        Returns:
+            (indices, scores), each of shape (Q, top_n), best match first. If the
+            probed lists hold fewer than top_n rows, the remainder is padded with
+            -1 indices and -inf scores.
+        """
+        queries = normalize_rows(np.atleast_2d(query_embeddings))
+        nprobe = max(1, min(nprobe, self.n_lists))
+        probed_lists = top_k_indices(queries @ self.centroids.T, nprobe)
+
+        all_indices = np.full((len(queries), top_n), -1, dtype=np.int64)
+        all_scores = np.full((len(queries), top_n), -np.inf, dtype=np.float32)
+        for q, (query, lists) in enumerate(zip(queries, probed_lists)):
+            candidates = np.concatenate(
+                [self.row_ids[self.offsets[l] : self.offsets[l + 1]] for l in lists]
+            )
+            candidates.sort()  # Sequential reads from the memory-mapped store.
+            scores = store.vectors[candidates] @ query
+            best = top_k_indices(scores, top_n)
+            all_indices[q, : len(best)] = candidates[best]
+            all_scores[q, : len(best)] = scores[best]
+        return all_indices, all_scores
+
+
+def evaluate_recall(
+    store: VectorStore,
+    index: IVFIndex,
+    k: int = 5,
+    nprobe_values=(1, 2, 4, 8, 16, 32, 64, 128),
+    n_queries: int = 200,
+    seed: int = 0,
+) -> list:
+    """
+    Measures recall@k of the IVF index against exact search, using corpus rows
+    with a little noise added as queries.
+
+    Returns:
+        One dict per nprobe with recall and mean per-query latency in ms.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(
+        store.row_count, size=min(n_queries, store.row_count), replace=False
+    )
+    queries = np.asarray(store.vectors[np.sort(rows)])
+    queries = queries + rng.normal(
+        scale=0.5 / np.sqrt(store.dimension), size=queries.shape
+    )
+
+    start = time.perf_counter()
+    exact_indices = np.vstack([store.search(query, k)[0] for query in queries])
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    report = [{"mode": "exact", "nprobe": None, "recall": 1.0, "latency_ms": exact_ms}]
+    for nprobe in nprobe_values:
+        if nprobe > index.n_lists:
+            break
+        start = time.perf_counter()
+        ann_indices, _ = index.search(store, queries, k, nprobe=nprobe)
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        hits = sum(
+            len(np.intersect1d(exact_row, ann_row))
+            for exact_row, ann_row in zip(exact_indices, ann_indices)
+        )
+        report.append(
+            {
+                "mode": "ivf",
+                "nprobe": nprobe,
+                "recall": hits / exact_indices.size,
+                "latency_ms": latency_ms,
+            }
+        )
+    return report
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    store = VectorStore.open(DATABASE_FILE, MODEL_NAME_EMBED)
+    if command == "build":
+        n_lists = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        start = time.perf_counter()
+        index = IVFIndex.build(store, n_lists)
+        index.save()
+        print(
+            f"✅ Built IVF index with {index.n_lists} lists over {store.row_count} vectors "
+            f"in {time.perf_counter() - start:.1f}s -> '{IVF_INDEX_FILE}'"
+        )
+    elif command == "eval":
+        k = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        index = IVFIndex.load(store)
+        print(
+            f"Recall@{k} vs exact search ({index.n_lists} lists, {store.row_count} vectors):"
+        )
+        for row in evaluate_recall(store, index, k=k):
+            label = "exact" if row["nprobe"] is None else f"nprobe={row['nprobe']}"
+            print(
+                f"  {label:>12}  recall={row['recall']:.3f}  latency={row['latency_ms']:.3f} ms/query"
+            )
+    else:
+        print(f"Unknown command '{command}'. Use 'build' or 'eval'.")
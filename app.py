@@ -1,11 +1,19 @@
 import streamlit as st
-import pandas as pd
 import altair as alt
-import json
-from io import StringIO
+import hashlib
+from contextlib import nullcontext
 
 # Import the logic functions from your provided scripts
-from vertex_ai_logic import analyze_arbitration_strategy, get_similar_arguments_as_json
+from vertex_ai_logic import stream_arbitration_strategy, search_similar_arguments
+from result_types import PrecedentResults
+from context_packing import pack_context, DEFAULT_CONTEXT_TOKEN_BUDGET
+from document_ingest import IngestionStream, ingestion_summary, SUPPORTED_TYPES
+import tracing
+
+# Token budget for the uploaded documents in the strategy prompt.
+CONTEXT_TOKEN_BUDGET = DEFAULT_CONTEXT_TOKEN_BUDGET
+# Traced runs are appended here as JSON lines; None keeps them in the UI only.
+TRACE_FILE = tracing.TRACE_FILE
 
 # --- CSS for the sticky left column ---
 st.markdown(
@@ -39,6 +47,12 @@ if "run_analysis" not in st.session_state:
     st.session_state.run_analysis = False
 if "analyzed_arguments" not in st.session_state:
     st.session_state.analyzed_arguments = []
+if "ingested_documents" not in st.session_state:
+    st.session_state.ingested_documents = []
+if "packed_context" not in st.session_state:
+    st.session_state.packed_context = None
+if "last_trace" not in st.session_state:
+    st.session_state.last_trace = None
 
 
 # --- Callback Function ---
@@ -50,6 +64,181 @@ def trigger_analysis():
         return
     st.session_state.analyzed_arguments = []  # Clear old results before running
     st.session_state.run_analysis = True
+    st.session_state.rerun_app = True
+
+
+# --- Result Rendering Helpers ---
+def create_analysis_chart(precedents: PrecedentResults):
+    if precedents is None or len(precedents) == 0:
+        return None
+    # Aggregate the few precedents per outcome directly from the columns.
+    bar_data, x0 = [], 0
+    for outcome in ["Yes", "No", "N/A"]:
+        rows = [
+            i for i, judgment in enumerate(precedents.judgment) if judgment == outcome
+        ]
+        bar_data.append(
+            {
+                "Outcome": outcome,
+                "Count": len(rows),
+                "CaseIDs": ", ".join(str(precedents.case_identifier[i]) for i in rows),
+                "Titles": "; ".join(str(precedents.case_title[i]) for i in rows),
+                "Summaries": "; ".join(
+                    str(precedents.argument_summary[i]) for i in rows
+                ),
+                "x0": x0,
+                "x1": x0 + len(rows),
+            }
+        )
+        x0 += len(rows)
+
+    bar_chart = (
+        alt.Chart(alt.Data(values=bar_data))
+        .mark_bar(height=30)
+        .encode(
+            x=alt.X("x0:Q", axis=None),
+            x2="x1:Q",
+            color=alt.Color(
+                "Outcome:N",
+                scale=alt.Scale(
+                    domain=["Yes", "No", "N/A"],
+                    range=["#4caf50", "#f44336", "#bdbdbd"],
+                ),
+                legend=None,
+            ),
+            tooltip=[
+                alt.Tooltip("Outcome:N", title="Outcome"),
+                alt.Tooltip("Count:Q", title="Count"),
+                alt.Tooltip("CaseIDs:N", title="Case IDs"),
+                alt.Tooltip("Titles:N", title="Titles"),
+                alt.Tooltip("Summaries:N", title="Summaries"),
+            ],
+        )
+        .properties(width=240, height=30)
+    )
+    return bar_chart
+
+
+def precedent_key(precedents: PrecedentResults) -> str:
+    """Content hash of a result set; identical results share one cached chart."""
+    return hashlib.sha256(precedents.to_json().encode("utf-8")).hexdigest()
+
+
+@st.cache_data(max_entries=1000, show_spinner=False)
+def outcome_chart_spec(result_key: str, _precedents: PrecedentResults) -> dict:
+    """Vega-Lite spec of a result set's outcome bar, built once per result_key."""
+    return create_analysis_chart(_precedents).to_dict()
+
+
+def display_argument_card(arg: dict, card_id: str):
+    title = arg.get("title", "Untitled Argument")
+    title_display = f"<div style='margin-bottom: -10px;'> <b>{title}</b>" + (
+        " ✨ <span style='color: #28a745;'>New</span>"
+        if arg.get("is_new_argument")
+        else ""
+    )
+    st.markdown(title_display, unsafe_allow_html=True)
+    check = arg.get("factual_check")
+    if check is True:
+        st.success("Factually Consistent", icon="✔️")
+    elif isinstance(check, str) and check.lower() not in ["n/a", "true"]:
+        st.warning(f"{check}", icon="⚠️")
+    st.text_area(
+        "",
+        value=arg.get("argument", ""),
+        height=100,
+        key=f"arg_{card_id}",
+        disabled=True,
+    )
+    if not arg.get("is_new_argument") and arg.get("source_text", "N/A") != "N/A":
+        st.caption(f'Source: "{arg.get("source_text")}"')
+    precedents = arg.get("similar_cases")
+    if precedents is not None and len(precedents):
+        # Keyed once per analysis result, so reruns reuse the cached spec.
+        if "chart_key" not in arg:
+            arg["chart_key"] = precedent_key(precedents)
+        with tracing.span("build_chart"):
+            spec = outcome_chart_spec(arg["chart_key"], precedents)
+        with tracing.span("render_chart"):
+            st.vega_lite_chart(spec, use_container_width=True)
+    else:
+        st.caption("No precedent data.")
+
+
+# Category -> (column heading, widget key prefix), in display order.
+ARGUMENT_CATEGORIES = {
+    "Jurisdiction": ("### ⚖️ Jurisdiction", "jur"),
+    "Admissibility": ("### 🧩 Admissibility", "adm"),
+    "Merits": ("### ⭐ Merits", "mer"),
+}
+
+
+def create_category_columns() -> dict:
+    """Lays out one headed column per argument category."""
+    st.header("In-Depth Argument Analysis")
+    columns = dict(zip(ARGUMENT_CATEGORIES, st.columns(len(ARGUMENT_CATEGORIES))))
+    for category, column in columns.items():
+        column.markdown(ARGUMENT_CATEGORIES[category][0])
+    return columns
+
+
+def display_in_category(arg: dict, columns: dict, card_counts: dict):
+    """Appends an argument's card to its category column, if it has a known one."""
+    category = arg.get("category")
+    if category not in columns:
+        return
+    index = card_counts.get(category, 0)
+    card_counts[category] = index + 1
+    with columns[category], tracing.span("render_card", category=category):
+        display_argument_card(arg, f"{ARGUMENT_CATEGORIES[category][1]}_{index}")
+
+
+def ingest_uploads(uploaded_files: list) -> list:
+    """Extracts the uploaded files in parallel, showing each page as it arrives."""
+    if not uploaded_files:
+        return []
+    with tracing.span("ingest_documents") as ingest_span:
+        stream = IngestionStream(
+            [(file.name, file.getvalue()) for file in uploaded_files]
+        )
+        progress = st.empty()
+        for page in stream:
+            progress.caption(f"📄 Reading '{page.document}', page {page.number}...")
+        progress.empty()
+        summary = ingestion_summary(stream.documents)
+        ingest_span.set(
+            files=summary["files"], pages=summary["pages"], cached=summary["cached"]
+        )
+    return stream.documents
+
+
+def display_ingestion_report(documents: list):
+    """Collapsible per-file size, page count and extraction time."""
+    summary = ingestion_summary(documents)
+    with st.expander(
+        f"Documents: {summary['files']} files, {summary['pages']} pages, "
+        f"{summary['size_bytes'] / 1e6:.1f} MB read in {summary['seconds']:.2f}s"
+        + (f" ({summary['cached']} cached)" if summary["cached"] else "")
+    ):
+        st.dataframe(
+            [document.report_row() for document in documents],
+            use_container_width=True,
+        )
+
+
+def run_trace():
+    """Traces this analysis run when timings are switched on; otherwise a no-op."""
+    if st.session_state.get("trace_enabled"):
+        return tracing.trace("dashboard_run")
+    return nullcontext()
+
+
+def display_trace(trace: tracing.Trace):
+    """Collapsible per-stage timing table of a traced run."""
+    with st.expander(f"⏱️ Timings: {trace.duration * 1000:,.0f} ms"):
+        if trace.counters:
+            st.caption(", ".join(f"{k}: {v}" for k, v in trace.counters.items()))
+        st.dataframe(trace.rows(), use_container_width=True)
 
 
 # --- Main App ---
@@ -65,197 +254,131 @@ st.title("Arbitration Strategy Dashboard")
 
 left_col, right_col = st.columns([2, 3])
 
+
 # --- LEFT COLUMN ---
-with left_col:
+# Each column is a fragment: editing the inputs reruns only the input panel,
+# and the results panel only reruns for its own interactions or a new analysis.
+@st.fragment
+def input_panel():
     st.header("Provide Input")
     st.text_area("My strategy idea is:", height=200, key="user_prompt")
     st.file_uploader(
-        "Upload factual documents (TXT)",
-        type=["txt"],
+        "Upload factual documents (PDF, DOCX, TXT)",
+        type=list(SUPPORTED_TYPES),
         accept_multiple_files=True,
         key="uploaded_files",
     )
     st.button(
         "Analyze Strategy & Find Precedents", on_click=trigger_analysis, type="primary"
     )
+    st.checkbox("Record timings", key="trace_enabled")
+    if st.session_state.pop("rerun_app", False):
+        # The button only reran this fragment; rerun the app to show results.
+        st.rerun()
+
 
 # --- RIGHT COLUMN ---
-with right_col:
+@st.fragment
+def results_panel():
+    rendered_this_run = False
     if st.session_state.run_analysis:
-        with st.spinner("Analyzing strategy and finding precedents..."):
-            factual_text = "\n\n---\n\n".join(
-                [
-                    StringIO(file.getvalue().decode("utf-8")).read()
-                    for file in st.session_state.get("uploaded_files", [])
-                ]
-            )
+        with (
+            st.spinner("Analyzing strategy and finding precedents..."),
+            run_trace() as trace,
+        ):
+            documents = ingest_uploads(st.session_state.get("uploaded_files") or [])
+            st.session_state.ingested_documents = documents
+            for document in documents:
+                if document.error:
+                    st.warning(f"Could not read '{document.name}': {document.error}")
 
-            # --- ROBUST ANALYSIS AND DATA HANDLING BLOCK ---
-            strategy_json_string = analyze_arbitration_strategy(
+            # Only the chunks most relevant to the strategy, within the budget.
+            with tracing.span("pack_context") as pack_span:
+                packed = pack_context(
+                    st.session_state.user_prompt,
+                    [
+                        (document.name, document.text)
+                        for document in documents
+                        if not document.error
+                    ],
+                    budget=CONTEXT_TOKEN_BUDGET,
+                )
+                pack_span.set(
+                    chunks=len(packed.chunks_used), tokens=packed.packed_tokens
+                )
+            st.session_state.packed_context = packed
+            factual_text = packed.text
+
+            # --- STREAMING ANALYSIS: render each argument as soon as it arrives ---
+            stream = stream_arbitration_strategy(
                 st.session_state.user_prompt, factual_text
             )
-            parsed_data = json.loads(strategy_json_string)
-
-            # Check if the initial analysis was successful
-            if isinstance(parsed_data, list) and parsed_data:
-                # Success: We received a list of arguments.
-                analyzed_args_list = parsed_data
-
-                # Now, loop through them to get similar cases
-                for i, arg_dict in enumerate(analyzed_args_list):
-                    st.progress(
-                        (i + 1) / len(analyzed_args_list),
-                        f"Searching precedents for: '{arg_dict['title']}'",
-                    )
-                    similar_cases_json_string = get_similar_arguments_as_json(
-                        arg_dict["argument"]
-                    )
-
-                    try:
-                        search_results = json.loads(similar_cases_json_string)
-                        # Fix for ValueError: Check if the search result is a list (success) or dict (error).
-                        if isinstance(search_results, list):
-                            arg_dict["similar_cases"] = pd.DataFrame(search_results)
-                        else:
-                            arg_dict["similar_cases"] = (
-                                pd.DataFrame()
-                            )  # Create empty DataFrame on search error
-                    except (json.JSONDecodeError, TypeError):
-                        arg_dict["similar_cases"] = (
-                            pd.DataFrame()
-                        )  # Handle invalid JSON
-
-                st.session_state.analyzed_arguments = analyzed_args_list
-
-            # Handle all failure cases from the initial analysis
-            elif isinstance(parsed_data, dict) and "error" in parsed_data:
-                # Failure: We received an error object. Display it.
-                st.error(f"Failed to Analyze Strategy: {parsed_data.get('error')}")
-                if "raw_response" in parsed_data:
-                    st.code(parsed_data["raw_response"], language="text")
-                st.session_state.analyzed_arguments = []
-            else:
+            analyzed_args_list, category_columns, card_counts = [], None, {}
+            for arg_dict in stream:
+                # Search this argument's precedents right away; the rest of the
+                # response keeps streaming in meanwhile.
+                with tracing.span("precedent_search"):
+                    arg_dict["similar_cases"] = search_similar_arguments(
+                        [arg_dict.get("argument", "")]
+                    )[0]
+                analyzed_args_list.append(arg_dict)
+                if category_columns is None:
+                    category_columns = create_category_columns()
+                display_in_category(arg_dict, category_columns, card_counts)
+
+            analysis = stream.result
+            if analysis.error:
+                # Failure: Display the error (any arguments received are kept).
+                st.error(f"Failed to Analyze Strategy: {analysis.error}")
+                if analysis.raw_response is not None:
+                    st.code(analysis.raw_response, language="text")
+            elif not analysis.arguments:
                 # Handle any other unexpected format.
                 st.error(
                     "Received an unexpected or empty response from the analysis service."
                 )
-                st.session_state.analyzed_arguments = []
+            if analysis.dropped:
+                # The valid arguments are shown; say what was skipped and why.
+                st.warning(
+                    f"Skipped {len(analysis.dropped)} malformed argument(s) in the "
+                    "model's response:\n\n"
+                    + "\n".join(f"- {reason}" for reason in analysis.dropped)
+                )
+            st.session_state.analyzed_arguments = analyzed_args_list
+            rendered_this_run = True
 
         st.session_state.run_analysis = False  # Reset flag
+        st.session_state.last_trace = trace
+        if trace is not None and TRACE_FILE:
+            trace.append_jsonl(TRACE_FILE)
 
-    # --- Display Results ---
-    if st.session_state.analyzed_arguments:
-        st.header("In-Depth Argument Analysis")
+    if st.session_state.ingested_documents:
+        display_ingestion_report(st.session_state.ingested_documents)
 
-        jurisdiction_args = [
-            arg
-            for arg in st.session_state.analyzed_arguments
-            if arg.get("category") == "Jurisdiction"
-        ]
-        admissibility_args = [
-            arg
-            for arg in st.session_state.analyzed_arguments
-            if arg.get("category") == "Admissibility"
-        ]
-        merits_args = [
-            arg
-            for arg in st.session_state.analyzed_arguments
-            if arg.get("category") == "Merits"
-        ]
+    packed = st.session_state.packed_context
+    if packed is not None and packed.total_chunks:
+        with st.expander(
+            f"Factual context: {len(packed.chunks_used)} of {packed.total_chunks} "
+            f"chunks, ~{packed.packed_tokens:,} of {packed.total_tokens:,} tokens"
+        ):
+            st.dataframe(packed.chunks_used, use_container_width=True)
 
-        analysis_col1, analysis_col2, analysis_col3 = st.columns(3)
-
-        def create_analysis_chart(df: pd.DataFrame):
-            if df is None or df.empty or "judgment" not in df.columns:
-                return None
-            grouped = (
-                df.groupby("judgment")
-                .agg(
-                    Count=("judgment", "size"),
-                    CaseIDs=("case_identifier", lambda x: ", ".join(map(str, x))),
-                    Titles=("case_title", lambda x: "; ".join(map(str, x))),
-                    Summaries=("argument_summary", lambda x: "; ".join(map(str, x))),
-                )
-                .reindex(["Yes", "No", "N/A"], fill_value=0)
-                .reset_index()
-                .rename(columns={"judgment": "Outcome"})
-            )
+    if st.session_state.last_trace is not None:
+        display_trace(st.session_state.last_trace)
 
-            bar_data = grouped.copy()
-            bar_data["x0"] = bar_data["Count"].cumsum().shift(fill_value=0)
-            bar_data["x1"] = bar_data["Count"].cumsum()
-
-            bar_chart = (
-                alt.Chart(bar_data)
-                .mark_bar(height=30)
-                .encode(
-                    x=alt.X("x0:Q", axis=None),
-                    x2="x1:Q",
-                    color=alt.Color(
-                        "Outcome:N",
-                        scale=alt.Scale(
-                            domain=["Yes", "No", "N/A"],
-                            range=["#4caf50", "#f44336", "#bdbdbd"],
-                        ),
-                        legend=None,
-                    ),
-                    tooltip=[
-                        alt.Tooltip("Outcome:N", title="Outcome"),
-                        alt.Tooltip("Count:Q", title="Count"),
-                        alt.Tooltip("CaseIDs:N", title="Case IDs"),
-                        alt.Tooltip("Titles:N", title="Titles"),
-                        alt.Tooltip("Summaries:N", title="Summaries"),
-                    ],
-                )
-                .properties(width=240, height=30)
-            )
-            return bar_chart
-
-        def display_argument_card(arg: dict, card_id: str):
-            title = arg.get("title", "Untitled Argument")
-            title_display = f"<div style='margin-bottom: -10px;'> <b>{title}</b>" + (
-                " ✨ <span style='color: #28a745;'>New</span>"
-                if arg.get("is_new_argument")
-                else ""
-            )
-            st.markdown(title_display, unsafe_allow_html=True)
-            check = arg.get("factual_check")
-            if check is True:
-                st.success("Factually Consistent", icon="✔️")
-            elif isinstance(check, str) and check.lower() not in ["n/a", "true"]:
-                st.warning(f"{check}", icon="⚠️")
-            st.text_area(
-                "",
-                value=arg.get("argument", ""),
-                height=100,
-                key=f"arg_{card_id}",
-                disabled=True,
-            )
-            if (
-                not arg.get("is_new_argument")
-                and arg.get("source_text", "N/A") != "N/A"
-            ):
-                st.caption(f'Source: "{arg.get("source_text")}"')
-            chart = create_analysis_chart(arg.get("similar_cases"))
-            if chart:
-                st.altair_chart(chart, use_container_width=True)
-            else:
-                st.caption("No precedent data.")
-
-        with analysis_col1:
-            st.markdown("### ⚖️ Jurisdiction")
-            for i, arg in enumerate(jurisdiction_args):
-                display_argument_card(arg, f"jur_{i}")
-        with analysis_col2:
-            st.markdown("### 🧩 Admissibility")
-            for i, arg in enumerate(admissibility_args):
-                display_argument_card(arg, f"adm_{i}")
-        with analysis_col3:
-            st.markdown("### ⭐ Merits")
-            for i, arg in enumerate(merits_args):
-                display_argument_card(arg, f"mer_{i}")
-
-    elif not st.session_state.run_analysis:
+    # --- Display Results ---
+    if st.session_state.analyzed_arguments and not rendered_this_run:
+        category_columns, card_counts = create_category_columns(), {}
+        for arg in st.session_state.analyzed_arguments:
+            display_in_category(arg, category_columns, card_counts)
+
+    elif not st.session_state.analyzed_arguments and not rendered_this_run:
         st.info(
             "📈 Your results will appear here after you provide input and click the analyze button."
         )
+
+
+with left_col:
+    input_panel()
+with right_col:
+    results_panel()
@@ -0,0 +1,131 @@
+"""
+Columnar (Parquet) copy of the argument database with typed, lazily loaded columns.
+
+The CSV stays the source of truth. `convert_to_parquet` writes a Parquet file
+with categorical dtypes for the low-cardinality columns and `key_keywords` as a
+real list column; the CSV's content hash is stored in the file metadata so a
+stale copy is rebuilt automatically. `load_argument_db` reads only the
+requested columns, so the search path never materializes the long text fields
+it does not return.
+
+    python argument_db.py [legal_arguments_database_merged.csv]
+"""
+
+import ast
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+from vector_store import DATABASE_FILE, file_sha256
+
+CATEGORICAL_COLUMNS = ["party", "document_type", "court_followed", "case_title"]
+LIST_COLUMNS = ["key_keywords"]
+# The database columns get_similar_arguments_as_json returns.
+SEARCH_COLUMNS = [
+    "case_identifier",
+    "case_title",
+    "argument_summary",
+    "court_followed",
+    "tribunal_reasoning",
+]
+CSV_HASH_METADATA_KEY = b"source_csv_sha256"
+
+
+def parquet_path_for(csv_file: str) -> str:
+    return csv_file.rsplit(".", 1)[0] + ".parquet"
+
+
+def parse_keywords(value) -> list:
+    """Parses a stringified Python list such as "['a', 'b']" into a list of strings."""
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        return []
+    try:
+        parsed = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return [part.strip(" '\"") for part in value.strip("[]").split(",") if part]
+    return [str(item) for item in parsed] if isinstance(parsed, (list, tuple)) else []
+
+
+def convert_to_parquet(csv_file: str = DATABASE_FILE, parquet_file: str = None) -> str:
+    """
+    Converts the CSV database to Parquet with typed columns.
+
+    Returns:
+        The path of the Parquet file written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet_file = parquet_file or parquet_path_for(csv_file)
+    db_df = pd.read_csv(csv_file)
+    for col in CATEGORICAL_COLUMNS:
+        # Missing values become "N/A" up front, as the app displays them anyway.
+        db_df[col] = db_df[col].fillna("N/A").astype("category")
+    for col in LIST_COLUMNS:
+        db_df[col] = db_df[col].map(parse_keywords)
+
+    table = pa.Table.from_pandas(db_df, preserve_index=False)
+    metadata = {
+        **(table.schema.metadata or {}),
+        CSV_HASH_METADATA_KEY: file_sha256(csv_file).encode(),
+    }
+    # Write to a private file then swap, so concurrent workers never read a
+    # half-written file or write over each other's.
+    fd, tmp_file = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(parquet_file)), suffix=".parquet.tmp"
+    )
+    os.close(fd)
+    try:
+        pq.write_table(table.replace_schema_metadata(metadata), tmp_file)
+        os.replace(tmp_file, parquet_file)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+    return parquet_file
+
+
+def _is_fresh(csv_file: str, parquet_file: str) -> bool:
+    import pyarrow.parquet as pq
+
+    try:
+        metadata = pq.read_schema(parquet_file).metadata or {}
+    except (FileNotFoundError, OSError):
+        return False
+    return metadata.get(CSV_HASH_METADATA_KEY, b"").decode() == file_sha256(csv_file)
+
+
+def load_argument_db(
+    csv_file: str = DATABASE_FILE, columns: list = None
+) -> pd.DataFrame:
+    """
+    Loads the argument database, reading only `columns` (all if None).
+
+    Uses the Parquet copy, rebuilding it first if it is missing or older than
+    the CSV. Without pyarrow installed, falls back to reading the CSV with the
+    same column projection and dtypes.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        db_df = pd.read_csv(csv_file, usecols=columns)
+        for col in CATEGORICAL_COLUMNS:
+            if col in db_df.columns:
+                db_df[col] = db_df[col].fillna("N/A").astype("category")
+        for col in LIST_COLUMNS:
+            if col in db_df.columns:
+                db_df[col] = db_df[col].map(parse_keywords)
+        return db_df
+
+    parquet_file = parquet_path_for(csv_file)
+    if not _is_fresh(csv_file, parquet_file):
+        convert_to_parquet(csv_file, parquet_file)
+    return pd.read_parquet(parquet_file, columns=columns)
+
+
+if __name__ == "__main__":
+    source_file = sys.argv[1] if len(sys.argv) > 1 else DATABASE_FILE
+    print(f"✅ Wrote '{convert_to_parquet(source_file)}'")
@@ -0,0 +1,136 @@
+"""
+Deterministic local stand-ins for the Vertex AI models.
+
+resources.py builds the models through a backend: "vertex" (the default) talks
+to Google Cloud; "fake" uses the classes below, so the app, the search path and
+the benchmarks run offline and reproducibly. Select it with
+ARBITRATION_BACKEND=fake or resources.set_backend("fake").
+
+Any backend only has to provide what vertex_ai_logic uses:
+
+- an embedding model with `get_embeddings(texts)` returning objects with a
+  `.values` list, one per text;
+- a generative model with `generate_content(prompt, stream=False)` returning
+  an object with `.text`, or, with stream=True, an iterable of such chunks.
+"""
+
+import hashlib
+import json
+import time
+
+import numpy as np
+
+FAKE_EMBEDDING_DIMENSION = 3072
+
+# A well-formed strategy analysis, as the reasoning model would return it.
+DEFAULT_STRATEGY_RESPONSE = json.dumps(
+    [
+        {
+            "title": "Lack of Jurisdiction Over the Counterclaim",
+            "argument": "The tribunal lacks jurisdiction over the environmental counterclaim because the BIT only allows claims by investors.",
+            "category": "Jurisdiction",
+            "factual_check": "true",
+            "source_text": "N/A",
+            "is_new_argument": True,
+        },
+        {
+            "title": "Unlawful Expropriation",
+            "argument": "Revoking the mining license without compensation or due process was an unlawful expropriation under the BIT.",
+            "category": "Merits",
+            "factual_check": "true",
+            "source_text": "the revocation amounted to an unlawful expropriation",
+            "is_new_argument": False,
+        },
+        {
+            "title": "Insufficient Scientific Basis",
+            "argument": "The government study does not establish causation, so the claimed environmental damages are inadmissible.",
+            "category": "Admissibility",
+            "factual_check": "true",
+            "source_text": "N/A",
+            "is_new_argument": True,
+        },
+    ],
+    indent=2,
+)
+
+
+class _Values:
+    __slots__ = ("values",)
+
+    def __init__(self, values: list):
+        self.values = values
+
+
+class _Text:
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def hash_vector(text: str, dimension: int = FAKE_EMBEDDING_DIMENSION) -> np.ndarray:
+    """Unit-length vector seeded by the SHA-256 of `text`: same text, same vector."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension)
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+
+class FakeEmbeddingModel:
+    """Hash-seeded embeddings with an optional simulated per-request latency."""
+
+    def __init__(
+        self,
+        dimension: int = FAKE_EMBEDDING_DIMENSION,
+        latency_ms: float = 0.0,
+        max_batch: int = None,
+    ):
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.max_batch = max_batch
+        self.calls = 0
+
+    def get_embeddings(self, texts: list) -> list:
+        if self.max_batch is not None and len(texts) > self.max_batch:
+            raise ValueError(
+                f"{len(texts)} texts in one request; the limit is {self.max_batch}."
+            )
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return [_Values(hash_vector(text, self.dimension).tolist()) for text in texts]
+
+
+class FakeGenerativeModel:
+    """
+    Returns a canned response after a simulated latency. Streaming splits it
+    into `stream_chunk_chars` pieces, with the latency spread over them.
+    """
+
+    def __init__(
+        self,
+        response: str = DEFAULT_STRATEGY_RESPONSE,
+        latency_ms: float = 0.0,
+        stream_chunk_chars: int = 64,
+    ):
+        self.response = response
+        self.latency_ms = latency_ms
+        self.stream_chunk_chars = stream_chunk_chars
+        self.calls = 0
+
+    def generate_content(self, prompt, stream: bool = False, **kwargs):
+        self.calls += 1
+        if not stream:
+            if self.latency_ms:
+                time.sleep(self.latency_ms / 1000)
+            return _Text(self.response)
+        return self._stream()
+
+    def _stream(self):
+        pieces = [
+            self.response[i : i + self.stream_chunk_chars]
+            for i in range(0, len(self.response), self.stream_chunk_chars)
+        ]
+        for piece in pieces:
+            if self.latency_ms:
+                time.sleep(self.latency_ms / 1000 / len(pieces))
+            yield _Text(piece)
@@ -0,0 +1,438 @@
+"""
+Offline benchmark of the search path on synthetic corpora.
+
+Runs the same search code as the app (vertex_ai_logic._search_similar_arguments,
+minus Streamlit's cache and the micro-batcher) against generated corpora of
+increasing size, with the "fake" backend (backends.py) standing in for Vertex
+AI, so no credentials or network are needed and every run sees the same data.
+
+Each corpus has topic-clustered unit vectors (a memory-mapped float32 store,
+as in production), BM25 text drawn from per-topic vocabularies, facet columns,
+int8/binary codes, a truncated-dimension copy and, optionally, an IVF index.
+For each size it reports:
+
+- build: seconds to write the store and build each index;
+- startup: seconds to open/load them from disk, and the first query's latency;
+- memory: bytes of each structure, and the process's peak RSS;
+- latency: p50/p95 ms of single-query search per mode;
+- throughput: queries per second when searching `--batch` queries at once;
+- recall: recall@5 of each quantized first pass against exact search, with
+  and without rescoring, using quantization.benchmark. The synthetic vectors
+  are not Matryoshka-trained, so "truncated" recall here is a lower bound;
+  run `python quantization.py bench` on the real store for its true recall.
+
+    python benchmark.py [--sizes 7365,100000,1000000] [--dimension 768]
+        [--modes exact,int8,binary,truncated,lexical,hybrid] [--ivf] [--queries 50]
+        [--batch 32] [--shards N|auto] [--truncated-dimension 256]
+        [--output benchmark_results.jsonl]
+
+The default dimension is 768 rather than gemini-embedding-001's 3072 so a
+1M-row store (3 GB at 768) fits on a laptop; exact-scan cost grows linearly
+with the dimension. `--shards` runs exact scans on sharded_search.py's process
+pool, as resources.SEARCH_SHARDS does in the app. Results are appended to `--output` as one JSON line per
+corpus size, for comparing runs over time.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource as rusage
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import resources
+from ann_index import IVFIndex
+from bm25 import BM25Index
+from embedding_cache import EmbeddingCache, set_default_cache
+from metadata_filter import FacetIndex
+from quantization import (
+    QuantizedIndex,
+    QUANTIZED_INDEX_FILES,
+    TRUNCATED_DIMENSION,
+    benchmark as quantized_recall,
+)
+from result_types import RESULT_COLUMNS
+from vector_store import VectorStore, normalize_rows
+
+DEFAULT_SIZES = [7_365, 100_000, 1_000_000]
+DEFAULT_DIMENSION = 768
+DEFAULT_MODES = ["exact", "int8", "binary", "truncated", "lexical", "hybrid"]
+DEFAULT_QUERIES = 50
+DEFAULT_BATCH = 32
+RESULTS_FILE = "benchmark_results.jsonl"
+
+N_TOPICS = 256
+VOCABULARY_SIZE = 20_000
+TOPIC_WORDS = 40
+WORDS_PER_ROW = 24
+GENERATE_CHUNK_ROWS = 16_384
+# case_title gets one facet bitmap per value (row_count / 8 bytes each), so the
+# synthetic corpus caps its distinct titles; see the facet memory it reports.
+N_CASE_TITLES = 500
+
+
+def _topic_words(rng: np.random.Generator) -> np.ndarray:
+    return rng.integers(0, VOCABULARY_SIZE, size=(N_TOPICS, TOPIC_WORDS))
+
+
+def _synthetic_text(rng, topic_words: np.ndarray, topics: np.ndarray) -> list:
+    """Two thirds topic words, one third background words, per row."""
+    n_topic = WORDS_PER_ROW * 2 // 3
+    picks = rng.integers(0, TOPIC_WORDS, size=(len(topics), n_topic))
+    words = np.concatenate(
+        [
+            topic_words[topics[:, None], picks],
+            rng.integers(
+                0, VOCABULARY_SIZE, size=(len(topics), WORDS_PER_ROW - n_topic)
+            ),
+        ],
+        axis=1,
+    )
+    return [" ".join(f"w{w}" for w in row) for row in words]
+
+
+class SyntheticCorpus:
+    """A generated corpus on disk, plus the queries to run against it."""
+
+    def __init__(
+        self,
+        directory: str,
+        n_rows: int,
+        dimension: int,
+        seed: int = 0,
+        truncated_dimension: int = TRUNCATED_DIMENSION,
+    ):
+        self.directory = directory
+        self.n_rows = n_rows
+        self.dimension = dimension
+        self.seed = seed
+        self.truncated_dimension = truncated_dimension
+        self.build_s = {}
+        self.manifest = {
+            "model_name": resources.MODEL_NAME_EMBED,
+            "database_sha256": f"synthetic-{n_rows}-{dimension}-{seed}",
+            "row_count": n_rows,
+            "dimension": dimension,
+        }
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _timed(self, name: str, fn):
+        start = time.perf_counter()
+        value = fn()
+        self.build_s[name] = time.perf_counter() - start
+        return value
+
+    def generate(self, ivf: bool = False, modes: list = DEFAULT_MODES):
+        """Writes the vector store and every index the benchmark will load."""
+        rng = np.random.default_rng(self.seed)
+        centroids = normalize_rows(rng.standard_normal((N_TOPICS, self.dimension)))
+        topic_words = _topic_words(rng)
+        self.topics = rng.integers(0, N_TOPICS, size=self.n_rows)
+
+        def write_store():
+            vectors = np.lib.format.open_memmap(
+                self.path("store.f32.npy"),
+                mode="w+",
+                dtype=np.float32,
+                shape=(self.n_rows, self.dimension),
+            )
+            for start in range(0, self.n_rows, GENERATE_CHUNK_ROWS):
+                topics = self.topics[start : start + GENERATE_CHUNK_ROWS]
+                noise = rng.standard_normal((len(topics), self.dimension))
+                vectors[start : start + len(topics)] = normalize_rows(
+                    centroids[topics] + noise / np.sqrt(self.dimension) * 1.5
+                )
+            vectors.flush()
+            del vectors
+
+        self._timed("store", write_store)
+        store = self.open_store()
+
+        texts = self._timed(
+            "text", lambda: _synthetic_text(rng, topic_words, self.topics)
+        )
+        bm25 = self._timed(
+            "bm25",
+            lambda: BM25Index.build(
+                texts, {"database_sha256": self.manifest["database_sha256"]}
+            ),
+        )
+        bm25.save(self.path("bm25.npz"))
+        del texts, bm25
+        for kind in QUANTIZED_INDEX_FILES:
+            if kind in modes:
+                index = self._timed(
+                    kind,
+                    lambda: QuantizedIndex.build(
+                        store, kind, truncated_dimension=self.truncated_dimension
+                    ),
+                )
+                index.save(self.path(f"{kind}.npz"))
+        if ivf:
+            index = self._timed("ivf", lambda: IVFIndex.build(store))
+            index.save(self.path("ivf.npz"))
+
+        # Held-out query texts on random topics; the fake model embeds them.
+        query_topics = rng.integers(0, N_TOPICS, size=max(DEFAULT_BATCH, 256))
+        self.query_texts = [
+            f"q{self.seed}-{i} {text}"
+            for i, text in enumerate(_synthetic_text(rng, topic_words, query_topics))
+        ]
+
+    def open_store(self) -> VectorStore:
+        return VectorStore(
+            np.load(self.path("store.f32.npy"), mmap_mode="r"), self.manifest
+        )
+
+    def facet_frame(self) -> pd.DataFrame:
+        rows = np.arange(self.n_rows)
+        return pd.DataFrame(
+            {
+                "party": np.where(rows % 2, "Claimant", "Respondent"),
+                "document_type": np.array(["Award", "Decision", "Order", "Opinion"])[
+                    rows % 4
+                ],
+                "court_followed": np.array(["Yes", "No", "Partial/Deferred", "N/A"])[
+                    (rows // 3) % 4
+                ],
+                "case_title": (rows % N_CASE_TITLES).astype(str),
+            }
+        )
+
+    def load(self):
+        """
+        Loads everything the app loads at startup.
+
+        Returns:
+            (SearchData, VectorIndex, seconds per component)
+        """
+        load_s = {}
+
+        def timed(name, fn):
+            start = time.perf_counter()
+            value = fn()
+            load_s[name] = time.perf_counter() - start
+            return value
+
+        store = timed("store", self.open_store)
+        bm25 = timed("bm25", lambda: BM25Index.load(self.path("bm25.npz")))
+        facets = timed("facets", lambda: FacetIndex.build(self.facet_frame()))
+        # Object columns share a few string objects, as repeated values do in pandas.
+        labels = np.array(
+            [f"Synthetic {i}" for i in range(N_CASE_TITLES)], dtype=object
+        )
+        row_labels = labels[np.arange(self.n_rows) % N_CASE_TITLES]
+        data = resources.SearchData(
+            row_count=self.n_rows,
+            result_columns={name: row_labels for name in RESULT_COLUMNS},
+            bm25_index=bm25,
+            facet_index=facets,
+        )
+        index = resources.VectorIndex(store, quantized_indexes={})
+        for kind in QUANTIZED_INDEX_FILES:
+            if os.path.exists(self.path(f"{kind}.npz")):
+                index.quantized_indexes[kind] = timed(
+                    kind,
+                    lambda: QuantizedIndex.load(store, kind, self.path(f"{kind}.npz")),
+                )
+        if os.path.exists(self.path("ivf.npz")):
+            index.ivf_index = timed(
+                "ivf", lambda: IVFIndex.load(store, self.path("ivf.npz"))
+            )
+        return data, index, load_s
+
+
+def memory_report(data, index) -> dict:
+    """Bytes held by each search structure (the store is memory-mapped)."""
+    bm25 = data.bm25_index
+    report = {
+        "store_on_disk": index.store.vectors.nbytes,
+        "bm25": bm25.offsets.nbytes + bm25.doc_ids.nbytes + bm25.weights.nbytes,
+        "facets": sum(
+            bitmap.nbytes
+            for column in data.facet_index.bitmaps.values()
+            for bitmap in column.values()
+        ),
+    }
+    for kind, quantized in index.quantized_indexes.items():
+        report[kind] = quantized.nbytes
+    if index.ivf_index is not None:
+        report["ivf"] = (
+            index.ivf_index.centroids.nbytes + index.ivf_index.row_ids.nbytes
+        )
+    return report
+
+
+def peak_rss_bytes() -> int:
+    peak = rusage.getrusage(rusage.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def _percentile_ms(samples: list, q: float) -> float:
+    return float(np.percentile(samples, q) * 1000)
+
+
+def benchmark_corpus(
+    corpus: SyntheticCorpus,
+    modes: list = DEFAULT_MODES,
+    n_queries: int = DEFAULT_QUERIES,
+    batch: int = DEFAULT_BATCH,
+    top_n: int = 5,
+) -> dict:
+    """Loads a generated corpus into the app's resources and times its search."""
+    data, index, load_s = corpus.load()
+    resources.provide("search_data", data)
+    resources.provide("vector_index", index)
+    import vertex_ai_logic  # After provide(), so its warm-up finds the corpus.
+
+    search = vertex_ai_logic._search_similar_arguments
+    queries = corpus.query_texts
+    result = {
+        "rows": corpus.n_rows,
+        "dimension": corpus.dimension,
+        "shards": resources.SEARCH_SHARDS,
+        "build_s": corpus.build_s,
+        "load_s": load_s,
+    }
+    start = time.perf_counter()
+    search([queries[0]], top_n, "exact")
+    result["first_query_ms"] = (time.perf_counter() - start) * 1000
+
+    result["modes"] = {}
+    for mode in modes:
+        samples = []
+        for text in queries[1 : n_queries + 1]:
+            start = time.perf_counter()
+            search([text], top_n, mode)
+            samples.append(time.perf_counter() - start)
+        batch_texts = queries[-batch:]
+        start = time.perf_counter()
+        search(batch_texts, top_n, mode)
+        batch_s = time.perf_counter() - start
+        result["modes"][mode] = {
+            "p50_ms": _percentile_ms(samples, 50),
+            "p95_ms": _percentile_ms(samples, 95),
+            "batch_qps": len(batch_texts) / batch_s,
+        }
+    quantized = [
+        index.quantized_indexes[m] for m in modes if m in index.quantized_indexes
+    ]
+    if quantized:
+        result["recall"] = quantized_recall(
+            index.store,
+            quantized,
+            k=top_n,
+            rescore_values=sorted({0, 50, vertex_ai_logic.QUANTIZED_RESCORE}),
+            n_queries=n_queries,
+        )
+    result["memory_bytes"] = memory_report(data, index)
+    result["peak_rss_bytes"] = peak_rss_bytes()
+    return result
+
+
+def print_result(result: dict):
+    mb = 1e6
+    print(
+        f"\n📊 {result['rows']:,} rows x {result['dimension']} dims  "
+        f"(first query {result['first_query_ms']:.1f} ms, "
+        f"peak RSS {result['peak_rss_bytes'] / mb:,.0f} MB)"
+    )
+    print(
+        "  build: " + ", ".join(f"{k} {v:.2f}s" for k, v in result["build_s"].items())
+    )
+    print("  load:  " + ", ".join(f"{k} {v:.3f}s" for k, v in result["load_s"].items()))
+    print(
+        "  memory: "
+        + ", ".join(f"{k} {v / mb:,.1f} MB" for k, v in result["memory_bytes"].items())
+    )
+    for mode, row in result["modes"].items():
+        print(
+            f"  {mode:>8}  p50={row['p50_ms']:8.2f} ms  p95={row['p95_ms']:8.2f} ms  "
+            f"batch={row['batch_qps']:9.1f} q/s"
+        )
+    for row in result.get("recall", []):
+        label = row["mode"] + ("" if row["rescore"] is None else f" +{row['rescore']}")
+        print(
+            f"  {label:>20}  recall@5={row['recall']:.3f}  "
+            f"{row['latency_ms']:8.2f} ms/query"
+        )
+
+
+def run(
+    sizes: list = DEFAULT_SIZES,
+    dimension: int = DEFAULT_DIMENSION,
+    modes: list = DEFAULT_MODES,
+    ivf: bool = False,
+    n_queries: int = DEFAULT_QUERIES,
+    batch: int = DEFAULT_BATCH,
+    output: str = RESULTS_FILE,
+    shards: int = 0,
+    truncated_dimension: int = TRUNCATED_DIMENSION,
+) -> list:
+    """Generates, loads and benchmarks one corpus per size, in a scratch directory."""
+    if ivf and "ivf" not in modes:
+        modes = modes + ["ivf"]
+    resources.set_backend("fake", embedding={"dimension": dimension})
+    resources.SEARCH_SHARDS = shards
+    directory = tempfile.mkdtemp(prefix="arbitration-bench-")
+    # Keep fake vectors out of the app's embedding cache.
+    set_default_cache(EmbeddingCache(os.path.join(directory, "embedding_cache.sqlite")))
+    results = []
+    try:
+        for n_rows in sizes:
+            corpus_dir = os.path.join(directory, str(n_rows))
+            os.makedirs(corpus_dir)
+            corpus = SyntheticCorpus(
+                corpus_dir, n_rows, dimension, truncated_dimension=truncated_dimension
+            )
+            print(f"⏳ Generating {n_rows:,} x {dimension} corpus...")
+            corpus.generate(ivf=ivf, modes=modes)
+            result = benchmark_corpus(corpus, modes, n_queries, batch)
+            print_result(result)
+            results.append(result)
+            if output:
+                with open(output, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"timestamp": time.time(), **result}) + "\n")
+            if shards > 1:
+                resources.sharded_search().close()
+            for name in ("search_data", "vector_index", "sharded_search"):
+                resources.reset(name)
+            shutil.rmtree(corpus_dir)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", default=",".join(str(size) for size in DEFAULT_SIZES)
+    )
+    parser.add_argument("--dimension", type=int, default=DEFAULT_DIMENSION)
+    parser.add_argument("--modes", default=",".join(DEFAULT_MODES))
+    parser.add_argument("--ivf", action="store_true", help="Also build and time IVF.")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH)
+    parser.add_argument("--shards", type=resources.shard_count, default=0)
+    parser.add_argument("--truncated-dimension", type=int, default=TRUNCATED_DIMENSION)
+    parser.add_argument("--output", default=RESULTS_FILE)
+    args = parser.parse_args()
+    run(
+        [int(size) for size in args.sizes.split(",")],
+        args.dimension,
+        args.modes.split(","),
+        args.ivf,
+        args.queries,
+        args.batch,
+        args.output,
+        args.shards,
+        args.truncated_dimension,
+    )
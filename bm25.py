@@ -0,0 +1,191 @@
+"""
+BM25 lexical search over the argument database, plus reciprocal rank fusion.
+
+Embedding similarity is weakest on exact legal citations ("USPTPA Art. 10.20.4",
+"Glamis Gold test"), which is where a lexical index is strongest. The index
+covers `argument_summary`, `legal_basis` and `key_keywords` and is stored as a
+CSR-style inverted index with the BM25 weight of every posting precomputed, so a
+query is one bincount over the postings of its terms. It needs no network, so it
+also serves as the offline fallback when Vertex AI is unreachable.
+
+    python bm25.py [legal_arguments_database_merged.csv]
+"""
+
+import json
+import re
+import sys
+
+import numpy as np
+
+from vector_store import DATABASE_FILE, file_sha256, top_k_indices
+
+BM25_FIELDS = ["argument_summary", "legal_basis", "key_keywords"]
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+# Keeps dotted/hyphenated references such as "10.20.4" or "fork-in-the-road" whole.
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def index_path_for(csv_file: str) -> str:
+    return csv_file.rsplit(".", 1)[0] + ".bm25.npz"
+
+
+class BM25Index:
+    """Inverted index with precomputed per-posting BM25 weights."""
+
+    def __init__(self, vocabulary: dict, offsets, doc_ids, weights, meta: dict):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.meta = meta
+
+    @property
+    def doc_count(self) -> int:
+        return self.meta["doc_count"]
+
+    @classmethod
+    def build(cls, documents: list, meta: dict = None) -> "BM25Index":
+        """Indexes a list of document strings; document i gets id i."""
+        postings = {}  # term -> {doc id: term frequency}
+        doc_lengths = np.zeros(len(documents), dtype=np.float32)
+        for doc_id, text in enumerate(documents):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        terms = sorted(postings)
+        vocabulary = {term: i for i, term in enumerate(terms)}
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.float32)
+        for i, term in enumerate(terms):
+            doc_ids[offsets[i] : offsets[i + 1]] = list(postings[term])
+            tfs[offsets[i] : offsets[i + 1]] = list(postings[term].values())
+
+        n_docs = len(documents)
+        doc_freq = np.diff(offsets).astype(np.float32)
+        idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_length = doc_lengths.mean() if n_docs else 1.0
+        length_norm = BM25_K1 * (
+            1 - BM25_B + BM25_B * doc_lengths[doc_ids] / max(avg_length, 1.0)
+        )
+        weights = np.repeat(idf, np.diff(offsets)) * tfs * (BM25_K1 + 1)
+        weights /= tfs + length_norm
+        meta = {**(meta or {}), "doc_count": n_docs}
+        return cls(vocabulary, offsets, doc_ids, weights.astype(np.float32), meta)
+
+    @classmethod
+    def build_from_database(cls, csv_file: str = DATABASE_FILE) -> "BM25Index":
+        from argument_db import load_argument_db  # pandas, only needed to build
+
+        db_df = load_argument_db(csv_file, columns=BM25_FIELDS)
+        documents = (
+            db_df["argument_summary"].fillna("").astype(str)
+            + " "
+            + db_df["legal_basis"].fillna("").astype(str)
+            + " "
+            + db_df["key_keywords"].map(" ".join)
+        ).tolist()
+        return cls.build(documents, {"database_sha256": file_sha256(csv_file)})
+
+    def save(self, path: str):
+        terms = np.array(sorted(self.vocabulary, key=self.vocabulary.get))
+        np.savez(
+            path,
+            terms=terms,
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            weights=self.weights,
+            meta=np.array(json.dumps(self.meta)),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path) as data:
+            vocabulary = {term: i for i, term in enumerate(data["terms"].tolist())}
+            return cls(
+                vocabulary,
+                data["offsets"],
+                data["doc_ids"],
+                data["weights"],
+                json.loads(str(data["meta"])),
+            )
+
+    @classmethod
+    def load_or_build(cls, csv_file: str = DATABASE_FILE) -> "BM25Index":
+        """Loads the persisted index for `csv_file`, rebuilding it if stale or missing."""
+        path = index_path_for(csv_file)
+        try:
+            index = cls.load(path)
+            if index.meta.get("database_sha256") == file_sha256(csv_file):
+                return index
+        except FileNotFoundError:
+            pass
+        index = cls.build_from_database(csv_file)
+        index.save(path)
+        return index
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for `query` (zeros where no term matches)."""
+        term_ids = {self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary}
+        if not term_ids:
+            return np.zeros(self.doc_count, dtype=np.float32)
+        spans = [slice(self.offsets[t], self.offsets[t + 1]) for t in term_ids]
+        return np.bincount(
+            np.concatenate([self.doc_ids[s] for s in spans]),
+            weights=np.concatenate([self.weights[s] for s in spans]),
+            minlength=self.doc_count,
+        )
+
+    def search(self, query: str, top_n: int = 5, rows: np.ndarray = None):
+        """
+        Returns (indices, scores) of the best matching documents, best first.
+        Only documents sharing at least one term with the query are returned,
+        and only among `rows` if given.
+        """
+        scores = self.scores(query)
+        if rows is not None:
+            masked = np.zeros_like(scores)
+            masked[rows] = scores[rows]
+            scores = masked
+        indices = top_k_indices(scores, top_n)
+        indices = indices[scores[indices] > 0]
+        return indices, scores[indices]
+
+
+def reciprocal_rank_fusion(rankings: list, top_n: int, k: int = RRF_K):
+    """
+    Fuses several best-first index rankings: each document scores sum(1 / (k + rank)).
+
+    Returns:
+        (indices, scores) of the top_n fused documents, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, index in enumerate(ranking):
+            fused[int(index)] = fused.get(int(index), 0.0) + 1.0 / (k + rank + 1)
+    ordered = sorted(fused, key=fused.get, reverse=True)[:top_n]
+    return (
+        np.array(ordered, dtype=np.int64),
+        np.array([fused[index] for index in ordered], dtype=np.float64),
+    )
+
+
+if __name__ == "__main__":
+    source_file = sys.argv[1] if len(sys.argv) > 1 else DATABASE_FILE
+    index = BM25Index.build_from_database(source_file)
+    index.save(index_path_for(source_file))
+    print(
+        f"✅ Indexed {index.doc_count} arguments, {len(index.vocabulary)} terms -> "
+        f"'{index_path_for(source_file)}'"
+    )
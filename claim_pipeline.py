@@ -0,0 +1,525 @@
+"""
+Concurrent, rate-limited claim extraction over the jus mundi case corpus.
+
+Replaces the serial loop in claim_collection.ipynb. Every decision and opinion
+is sent to Gemini from a thread pool behind a token-bucket rate limiter, with
+exponential backoff on transient API errors. Each document's arguments are
+appended to the output CSV as soon as it finishes, and its
+(case identifier, document title) pair is recorded in a progress file, so an
+interrupted run can simply be started again and skips finished documents.
+
+Long documents are split into overlapping sections that are extracted in
+parallel like separate documents; their arguments are then merged into one
+list per document, collapsing arguments that several sections repeat (by
+embedding similarity when an embedding model is given, otherwise by summary
+text).
+
+    python claim_pipeline.py [--folder jus_mundi_hackathon_data/cases/] [--workers 8] [--rate 2]
+        [--section-chars 60000]
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from strategy_parsing import parse_array
+
+FOLDER_PATH = "jus_mundi_hackathon_data/cases/"
+OUTPUT_FILE = "legal_arguments_database.csv"
+PROGRESS_FILE = "claim_collection_progress.jsonl"
+COLUMN_ORDER = [
+    "case_identifier",
+    "case_title",
+    "document_title",
+    "document_type",
+    "party",
+    "argument_summary",
+    "legal_basis",
+    "key_keywords",
+    "court_followed",
+    "tribunal_reasoning",
+]
+DEFAULT_WORKERS = 8
+# Tasks queued on the pool per worker; documents are read only as slots free up.
+IN_FLIGHT_PER_WORKER = 2
+DEFAULT_RATE_PER_SECOND = 2.0
+MAX_RETRIES = 5
+# Documents longer than this are extracted section by section (~15k tokens each).
+SECTION_CHARS = 60_000
+# Shared between consecutive sections so an argument cut at a boundary is seen whole.
+SECTION_OVERLAP_CHARS = 3_000
+# Cosine similarity above which two arguments of the same party are merged.
+MERGE_SIMILARITY_THRESHOLD = 0.92
+
+# Gemini response schema for the extraction, also used to validate each argument.
+EXTRACTION_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "argument_summary": {"type": "string"},
+            "party": {"type": "string"},
+            "legal_basis": {"type": "string"},
+            "key_keywords": {"type": "array", "items": {"type": "string"}},
+            "court_followed": {
+                "type": "string",
+                "enum": ["Yes", "No", "Partial/Deferred"],
+            },
+            "tribunal_reasoning": {"type": "string"},
+        },
+        "required": ["argument_summary", "party"],
+    },
+}
+# Settings for the extraction model's GenerationConfig: JSON output constrained
+# to EXTRACTION_RESPONSE_SCHEMA.
+EXTRACTION_GENERATION_SETTINGS = {
+    "temperature": 0.2,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+    "response_mime_type": "application/json",
+    "response_schema": EXTRACTION_RESPONSE_SCHEMA,
+}
+
+EXTRACTION_PROMPT = [
+    "You are an expert legal analyst specializing in international arbitration. Your task is to read the following legal decision text and identify the distinct arguments made by the Claimant (or Petitioner/Investor) and the Respondent (or Defendant/State).",
+    "For each distinct argument you identify, you must provide a structured JSON object with the following information:",
+    "1. `argument_summary`: A concise, one-sentence summary of the argument.",
+    "2. `party`: The party that made the argument ('Claimant' or 'Respondent').",
+    "3. `legal_basis`: The specific treaty articles (e.g., 'DR-CAFTA Art. 10.16.1'), legal principles (e.g., 'effet utile', 'VCLT Art. 31'), or case law cited as the foundation for the argument.",
+    "4. `key_keywords`: A JSON list of important legal or factual keywords related to the argument (e.g., ['reflective loss', 'fork-in-the-road', 'waiver requirement', 'NAFTA']).",
+    "5. `court_followed`: Whether the tribunal/court followed the argument ('Yes', 'No', or 'Partial/Deferred').",
+    "6. `tribunal_reasoning`: A concise summary of WHY the tribunal agreed or disagreed with this specific argument. If the reasoning is not explicitly stated, use 'N/A'.",
+    "Provide your output as a valid JSON array of objects only. Do not include any other text, explanation, or markdown formatting. Each object must have these exact keys: `argument_summary`, `party`, `legal_basis`, `key_keywords`, `court_followed`, `tribunal_reasoning`.",
+    "Example output format:",
+    """
+[
+  {
+    "argument_summary": "The Respondent argued that claims for reflective loss must be brought under Article 10.16.1(b) to avoid rendering that provision meaningless.",
+    "party": "Respondent",
+    "legal_basis": "DR-CAFTA Art. 10.16.1(b), Principle of 'effet utile', VCLT Art. 31",
+    "key_keywords": ["reflective loss", "derivative claim", "effet utile", "shareholder claims", "treaty interpretation"],
+    "court_followed": "No",
+    "tribunal_reasoning": "The majority found that Article 10.16.1(b) was not rendered useless because it offers a different utility, such as recovering 100% of an enterprise's losses, which is distinct from a shareholder's specific loss claim."
+  }
+]
+        """,
+    "Here is the legal decision text:",
+    "---",
+]
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def analyze_decision_text(model, decision_text: str) -> list:
+    """
+    Sends decision text to Gemini and returns the extracted argument dicts.
+
+    Every argument that parses and matches EXTRACTION_RESPONSE_SCHEMA is kept,
+    even if others in the response are damaged; those are skipped with a
+    warning rather than failing the whole document.
+
+    Raises:
+        ValueError: If the response has text but no valid argument (not retried).
+        Exception: Any API error, left to the caller to retry.
+    """
+    response = model.generate_content(EXTRACTION_PROMPT + [decision_text])
+    arguments, dropped = parse_array(response.text, EXTRACTION_RESPONSE_SCHEMA)
+    if dropped and not arguments:
+        raise ValueError(f"No valid arguments in response: {'; '.join(dropped)}")
+    if dropped:
+        print(f"  ⚠️ Skipped {len(dropped)} malformed argument(s): {dropped[0]}")
+    return arguments
+
+
+def split_sections(
+    text: str,
+    section_chars: int = SECTION_CHARS,
+    overlap_chars: int = SECTION_OVERLAP_CHARS,
+) -> list:
+    """
+    Splits text into sections of at most `section_chars`, each starting
+    `overlap_chars` before the previous one ended. Sections end at a paragraph
+    (or failing that, line or sentence) break where one is near the limit.
+    """
+    if len(text) <= section_chars:
+        return [text]
+    sections, start = [], 0
+    while True:
+        end = start + section_chars
+        if end >= len(text):
+            sections.append(text[start:])
+            return sections
+        # Break no earlier than halfway into the section.
+        floor = start + section_chars // 2
+        for separator in ("\n\n", "\n", ". "):
+            cut = text.rfind(separator, floor, end)
+            if cut != -1:
+                end = cut + len(separator)
+                break
+        sections.append(text[start:end])
+        start = max(end - overlap_chars, start + 1)
+
+
+def merge_texts(section_arguments: list) -> list:
+    """Text embedded to compare each argument, flattened in document order."""
+    return [
+        f"{arg.get('argument_summary', '')} | {arg.get('legal_basis', '')}"
+        for section in section_arguments
+        for arg in section
+    ]
+
+
+def merge_arguments(
+    section_arguments: list,
+    embedding_model=None,
+    threshold: float = MERGE_SIMILARITY_THRESHOLD,
+    vectors=None,
+) -> list:
+    """
+    Merges per-section argument lists into one list for the document.
+
+    Arguments are compared within each party. With an embedding model, an
+    argument is a duplicate of an earlier one whose summary and legal basis
+    embed with cosine similarity >= threshold (leader clustering, as in
+    diversity.py); without one, only identical summaries are merged. The
+    earliest argument of each group is kept, with fields it left as 'N/A'
+    filled in from its duplicates.
+
+    Args:
+        section_arguments: One argument list per section, in document order.
+        embedding_model: Optional TextEmbeddingModel; merge_texts are embedded
+            with it, one request per batch, without rate limiting.
+        vectors: Embeddings of merge_texts(section_arguments), if already
+            computed (run_pipeline embeds them behind its rate limiter).
+
+    Returns:
+        The merged arguments, in order of first appearance.
+    """
+    arguments = [arg for section in section_arguments for arg in section]
+    if len(section_arguments) <= 1 or not arguments:
+        return arguments
+
+    if vectors is None and embedding_model is not None:
+        from indexer import embed_with_retry, embedding_batches
+
+        vectors = [
+            values
+            for batch in embedding_batches(merge_texts(section_arguments))
+            for values in embed_with_retry(embedding_model, batch)
+        ]
+    if vectors is not None:
+        import numpy as np
+
+        from diversity import cluster_near_duplicates
+        from vector_store import normalize_rows
+
+        vectors = normalize_rows(vectors)
+        canonical_of = np.arange(len(arguments))
+        parties = [str(arg.get("party", "")).strip().lower() for arg in arguments]
+        for party in set(parties):
+            rows = np.array([i for i, p in enumerate(parties) if p == party])
+            canonical_of[rows] = rows[cluster_near_duplicates(vectors[rows], threshold)]
+    else:
+        first_seen = {}
+        canonical_of = [
+            first_seen.setdefault(
+                (
+                    str(arg.get("party", "")).strip().lower(),
+                    " ".join(str(arg.get("argument_summary", "")).lower().split()),
+                ),
+                i,
+            )
+            for i, arg in enumerate(arguments)
+        ]
+
+    merged = {}
+    for i, canonical in enumerate(canonical_of):
+        canonical = int(canonical)
+        if canonical not in merged:
+            merged[canonical] = dict(arguments[canonical])
+        for key, value in arguments[i].items():
+            if merged[canonical].get(key) in (None, "", "N/A", []):
+                merged[canonical][key] = value
+    return list(merged.values())
+
+
+def iter_documents(folder_path: str, files: list):
+    """Yields one dict per decision or opinion with text content."""
+    for filename in files:
+        try:
+            with open(os.path.join(folder_path, filename), "r", encoding="utf-8") as f:
+                case_data = json.load(f)
+        except Exception as e:
+            print(f"Could not read file {filename}. Error: {e}")
+            continue
+        # Fall back to the file name so cases without an identifier don't collide.
+        case_identifier = case_data.get("Identifier") or os.path.splitext(filename)[0]
+        case_title = case_data.get("Title", "Unknown_Title")
+        for document in case_data.get("Decisions", []):
+            for doc in [document] + document.get("Opinions", []):
+                if doc and doc.get("Content"):
+                    yield {
+                        "case_identifier": case_identifier,
+                        "case_title": case_title,
+                        "document_title": doc.get("Title", "N/A"),
+                        "document_type": doc.get("Type", "N/A"),
+                        "text": doc["Content"],
+                    }
+
+
+def load_progress(progress_file: str = PROGRESS_FILE) -> set:
+    """Returns the (case identifier, document title) pairs already processed."""
+    done = set()
+    if os.path.exists(progress_file):
+        with open(progress_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    done.add((record["case_identifier"], record["document_title"]))
+    return done
+
+
+class _ResultWriter:
+    """Appends argument rows to the CSV and marks documents done, under one lock."""
+
+    def __init__(self, output_file: str, progress_file: str):
+        self.output_file = output_file
+        self.progress_file = progress_file
+        self._lock = threading.Lock()
+
+    def write(self, doc: dict, arguments: list) -> None:
+        with self._lock:
+            new_file = not os.path.exists(self.output_file)
+            # With a BOM, like the notebook's CSV, so Excel reads it as UTF-8.
+            with open(self.output_file, "a", newline="", encoding="utf-8-sig") as f:
+                writer = csv.DictWriter(
+                    f, fieldnames=COLUMN_ORDER, extrasaction="ignore"
+                )
+                if new_file:
+                    writer.writeheader()
+                for arg in arguments:
+                    row = {**arg, **{k: doc[k] for k in COLUMN_ORDER[:4]}}
+                    writer.writerow(
+                        {col: _csv_value(row.get(col)) for col in COLUMN_ORDER}
+                    )
+            with open(self.progress_file, "a", encoding="utf-8") as f:
+                record = {k: doc[k] for k in ("case_identifier", "document_title")}
+                record["arguments"] = len(arguments)
+                f.write(json.dumps(record) + "\n")
+
+
+def _csv_value(value):
+    # Lists are written as their Python repr, matching the existing database.
+    return str(value) if isinstance(value, list) else value
+
+
+def _extract_with_retry(model, bucket: TokenBucket, text: str) -> list:
+    for attempt in range(MAX_RETRIES):
+        bucket.acquire()
+        try:
+            return analyze_decision_text(model, text)
+        except ValueError:
+            raise
+        except Exception:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(2**attempt + random.random())
+
+
+def run_pipeline(
+    model,
+    folder_path: str = FOLDER_PATH,
+    files: list = None,
+    output_file: str = OUTPUT_FILE,
+    progress_file: str = PROGRESS_FILE,
+    workers: int = DEFAULT_WORKERS,
+    rate_per_second: float = DEFAULT_RATE_PER_SECOND,
+    embedding_model=None,
+    section_chars: int = SECTION_CHARS,
+) -> dict:
+    """
+    Extracts arguments from every unprocessed document in `folder_path`.
+
+    Every section of every document is a separate task on the pool, so the
+    sections of one long award are extracted in parallel. Documents are read
+    as tasks finish, keeping at most `workers * IN_FLIGHT_PER_WORKER` sections
+    queued. When a document's last section finishes, the texts to merge it on
+    are embedded, in batches that are tasks on the same pool behind the same
+    token bucket, and then its sections are merged and the result is written.
+
+    Args:
+        model: A GenerativeModel (anything with generate_content).
+        files: Case file names to process; defaults to every .json in the folder.
+        workers: Maximum number of concurrent requests.
+        rate_per_second: Sustained request rate allowed by the token bucket.
+        embedding_model: Optional TextEmbeddingModel used to merge near-duplicate
+            arguments across sections; without it only identical ones are merged.
+        section_chars: Length above which a document is split into sections.
+
+    Returns:
+        Counts of processed, skipped and failed documents, sections sent and
+        extracted arguments.
+    """
+    if files is None:
+        files = sorted(f for f in os.listdir(folder_path) if f.endswith(".json"))
+    done = load_progress(progress_file)
+    writer = _ResultWriter(output_file, progress_file)
+    bucket = TokenBucket(rate_per_second)
+    counts = {"processed": 0, "skipped": 0, "failed": 0, "sections": 0, "arguments": 0}
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
+    pending = {}  # future -> ("section" or "embed", doc, index)
+    results = {}  # id(doc) -> per-section argument lists
+    embeddings = {}  # id(doc) -> per-batch merge embeddings
+    print(f"{len(files)} case files, {len(done)} documents already done.")
+
+    if embedding_model is not None:
+        from indexer import embed_with_retry, embedding_batches
+
+    def finish(doc, value):
+        writer.write(doc, value)
+        counts["processed"] += 1
+        counts["arguments"] += len(value)
+        print(
+            f"  ✓ [{counts['processed']}] '{doc['document_title']}' "
+            f"({doc['case_title']}): {len(value)} arguments"
+        )
+
+    def collect(pool):
+        """Waits for at least one task and handles whatever has finished."""
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            stage, doc, index = pending.pop(future)
+            if id(doc) not in results:
+                continue  # Another task of this document already failed.
+            try:
+                value = future.result()
+            except Exception as e:
+                counts["failed"] += 1
+                del results[id(doc)]
+                embeddings.pop(id(doc), None)
+                # Not marked done, so the whole document is retried next run.
+                print(f"  ✗ '{doc['document_title']}' ({doc['case_title']}): {e}")
+                continue
+            sections = results[id(doc)]
+            if stage == "section":
+                sections[index] = value
+                if any(section is None for section in sections):
+                    continue
+                if len(sections) > 1 and embedding_model is not None:
+                    batches = embedding_batches(merge_texts(sections))
+                    if batches:
+                        embeddings[id(doc)] = [None] * len(batches)
+                        for batch_index, batch in enumerate(batches):
+                            embed = pool.submit(
+                                embed_with_retry,
+                                embedding_model,
+                                batch,
+                                bucket.acquire,
+                            )
+                            pending[embed] = ("embed", doc, batch_index)
+                        continue
+                vectors = None
+            else:
+                batches = embeddings[id(doc)]
+                batches[index] = value
+                if any(batch is None for batch in batches):
+                    continue
+                vectors = [values for batch in batches for values in batch]
+                del embeddings[id(doc)]
+            del results[id(doc)]
+            # Clustering a document's arguments is quick; no need for the pool.
+            finish(doc, merge_arguments(sections, vectors=vectors))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for doc in iter_documents(folder_path, files):
+            key = (doc["case_identifier"], doc["document_title"])
+            if key in done:
+                counts["skipped"] += 1
+                continue
+            done.add(key)
+            sections = split_sections(doc["text"], section_chars)
+            results[id(doc)] = [None] * len(sections)
+            counts["sections"] += len(sections)
+            for index, section in enumerate(sections):
+                while len(pending) >= max_in_flight:
+                    collect(pool)
+                future = pool.submit(_extract_with_retry, model, bucket, section)
+                pending[future] = ("section", doc, index)
+        while pending:
+            collect(pool)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--folder", default=FOLDER_PATH)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_PER_SECOND)
+    parser.add_argument("--section-chars", type=int, default=SECTION_CHARS)
+    args = parser.parse_args()
+
+    import vertexai
+    from vertexai.generative_models import (
+        GenerativeModel,
+        GenerationConfig,
+        HarmCategory,
+        HarmBlockThreshold,
+    )
+    from vertexai.language_models import TextEmbeddingModel
+
+    vertexai.init(project="hack-thelaw25cam-586", location="us-central1")
+    model = GenerativeModel(
+        "gemini-2.0-flash-lite-001",
+        generation_config=GenerationConfig(**EXTRACTION_GENERATION_SETTINGS),
+        safety_settings={
+            category: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
+            for category in (
+                HarmCategory.HARM_CATEGORY_HARASSMENT,
+                HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
+                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+            )
+        },
+    )
+    start = time.perf_counter()
+    counts = run_pipeline(
+        model,
+        args.folder,
+        output_file=args.output,
+        workers=args.workers,
+        rate_per_second=args.rate,
+        embedding_model=TextEmbeddingModel.from_pretrained("gemini-embedding-001"),
+        section_chars=args.section_chars,
+    )
+    print(f"✅ {counts} in {(time.perf_counter() - start) / 60:.1f} min")
@@ -0,0 +1,148 @@
+"""
+Packs the most relevant parts of the uploaded factual documents into a token budget.
+
+Real case files run to hundreds of pages, far more than the strategy prompt
+needs. Documents are split into paragraph-aligned chunks, the chunks are
+scored against the strategy text with BM25 (bm25.py, built over the chunks
+themselves, so no network is needed), and the best ones are packed until the
+budget is spent. Packed chunks are emitted in document order so the
+background still reads coherently, with "[...]" marking the gaps.
+
+Token counts are estimated at ~4 characters per token, which is close enough
+for budgeting Gemini prompts.
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+
+from bm25 import BM25Index
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 6_000
+DEFAULT_CHUNK_TOKENS = 300
+CHARS_PER_TOKEN = 4
+DOCUMENT_SEPARATOR = "\n\n---\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def chunk_document(text: str, chunk_tokens: int = DEFAULT_CHUNK_TOKENS) -> list:
+    """
+    Splits text into chunks of about `chunk_tokens`, on paragraph boundaries
+    where possible. Paragraphs longer than a chunk are split between sentences.
+    """
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= max_chars:
+            if paragraph:
+                pieces.append(paragraph)
+            continue
+        current = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                pieces.append(current)
+                current = ""
+            current = f"{current} {sentence}" if current else sentence
+        if current:
+            pieces.append(current)
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+@dataclass(slots=True)
+class PackedContext:
+    """The packed factual text and a record of which chunks went into it."""
+
+    text: str
+    chunks_used: list = field(default_factory=list)  # one dict per chunk, in order
+    total_chunks: int = 0
+    total_tokens: int = 0  # of all documents, before packing
+    packed_tokens: int = 0
+    budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET
+
+    @property
+    def trimmed(self) -> bool:
+        return len(self.chunks_used) < self.total_chunks
+
+
+def pack_context(
+    query: str,
+    documents: list,
+    budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+) -> PackedContext:
+    """
+    Selects the chunks of `documents` most relevant to `query` within `budget` tokens.
+
+    Args:
+        query: The strategy text the chunks are ranked against. If it is empty
+            or matches nothing, chunks are taken in document order.
+        documents: (name, text) pairs.
+        budget: Maximum estimated tokens of packed text.
+        chunk_tokens: Target chunk size.
+
+    Returns:
+        A PackedContext. If everything fits, all chunks are used and the text is
+        the documents joined as before.
+    """
+    chunks = [
+        {"document": name, "chunk": i, "text": chunk, "tokens": estimate_tokens(chunk)}
+        for name, text in documents
+        for i, chunk in enumerate(chunk_document(text, chunk_tokens))
+    ]
+    total_tokens = sum(chunk["tokens"] for chunk in chunks)
+    if total_tokens <= budget:
+        selected = list(range(len(chunks)))
+        scores = [None] * len(chunks)
+    else:
+        scores = BM25Index.build([chunk["text"] for chunk in chunks]).scores(
+            query or ""
+        )
+        # Best first; ties (e.g. no query) keep document order.
+        ranked = sorted(range(len(chunks)), key=lambda i: -scores[i])
+        selected, used = [], 0
+        for i in ranked:
+            if used + chunks[i]["tokens"] <= budget:
+                selected.append(i)
+                used += chunks[i]["tokens"]
+        selected.sort()
+
+    parts, chunks_used = [], []
+    for position, i in enumerate(selected):
+        chunk = chunks[i]
+        previous = chunks[selected[position - 1]] if position else None
+        if previous is not None and previous["document"] != chunk["document"]:
+            parts.append(DOCUMENT_SEPARATOR)
+        elif previous is not None and selected[position - 1] != i - 1:
+            parts.append("\n\n[...]\n\n")
+        elif previous is not None:
+            parts.append("\n\n")
+        parts.append(chunk["text"])
+        chunks_used.append(
+            {
+                "document": chunk["document"],
+                "chunk": chunk["chunk"],
+                "tokens": chunk["tokens"],
+                "score": None if scores[i] is None else float(scores[i]),
+            }
+        )
+    return PackedContext(
+        text="".join(parts),
+        chunks_used=chunks_used,
+        total_chunks=len(chunks),
+        total_tokens=total_tokens,
+        packed_tokens=sum(chunk["tokens"] for chunk in chunks_used),
+        budget=budget,
+    )
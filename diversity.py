@@ -0,0 +1,166 @@
+"""
+Near-duplicate collapse and diversity-aware (MMR) selection of precedents.
+
+The same argument is often extracted from a case's award, its dissenting
+opinions and related procedural orders, so a plain top-5 can be five copies of
+one precedent. Two complementary fixes:
+
+- Offline, `cluster_near_duplicates` groups rows whose embeddings are nearly
+  identical (cosine >= threshold) and keeps the first row of each group as its
+  canonical entry. Search then keeps only the best-ranked row of each group
+  among its candidates (after any metadata filter).
+- At query time, `mmr_select` picks results from a larger candidate pool by
+  maximal marginal relevance, trading relevance to the query against
+  similarity to the results already picked.
+
+    python diversity.py [threshold]
+"""
+
+import json
+import sys
+import time
+
+import numpy as np
+
+from vector_store import DATABASE_FILE, MODEL_NAME_EMBED, VectorStore, StaleIndexError
+
+CANONICAL_INDEX_FILE = "arguments_embeddings.canonical.npz"
+DEFAULT_DUPLICATE_THRESHOLD = 0.97
+DEFAULT_MMR_LAMBDA = 0.7
+CLUSTER_BLOCK_ROWS = 512
+
+
+def cluster_near_duplicates(
+    vectors: np.ndarray, threshold: float = DEFAULT_DUPLICATE_THRESHOLD
+) -> np.ndarray:
+    """
+    Leader clustering in row order over L2-normalized vectors: each row not yet
+    claimed becomes a canonical row and claims every later unclaimed row with
+    cosine similarity >= threshold. Similarities are computed block by block.
+
+    Returns:
+        For every row, the index of its canonical row (itself if canonical).
+    """
+    n_rows = len(vectors)
+    canonical_of = np.full(n_rows, -1, dtype=np.int64)
+    for start in range(0, n_rows, CLUSTER_BLOCK_ROWS):
+        block = np.asarray(vectors[start : start + CLUSTER_BLOCK_ROWS])
+        # Earlier rows are all claimed already, so only compare against later ones.
+        similarities = block @ np.asarray(vectors[start:]).T
+        for offset in range(len(block)):
+            row = start + offset
+            if canonical_of[row] >= 0:
+                continue
+            unclaimed = canonical_of[start:] < 0
+            members = np.flatnonzero(unclaimed & (similarities[offset] >= threshold))
+            canonical_of[start + members] = row
+            canonical_of[row] = row  # Also covers all-zero vectors.
+    return canonical_of
+
+
+class CanonicalIndex:
+    """Maps every row of a vector store to the canonical row of its duplicate group."""
+
+    def __init__(self, canonical_of: np.ndarray, meta: dict):
+        self.canonical_of = canonical_of
+        self.meta = meta
+        self.canonical_rows = np.flatnonzero(
+            canonical_of == np.arange(len(canonical_of))
+        )
+
+    @classmethod
+    def build(
+        cls, store: VectorStore, threshold: float = DEFAULT_DUPLICATE_THRESHOLD
+    ) -> "CanonicalIndex":
+        meta = {
+            "model_name": store.manifest["model_name"],
+            "database_sha256": store.manifest["database_sha256"],
+            "row_count": store.row_count,
+            "threshold": threshold,
+        }
+        return cls(cluster_near_duplicates(store.vectors, threshold), meta)
+
+    def cluster_sizes(self) -> np.ndarray:
+        """Number of rows in each canonical row's group, aligned with canonical_rows."""
+        return np.bincount(self.canonical_of, minlength=len(self.canonical_of))[
+            self.canonical_rows
+        ]
+
+    def save(self, path: str = CANONICAL_INDEX_FILE):
+        np.savez(
+            path, canonical_of=self.canonical_of, meta=np.array(json.dumps(self.meta))
+        )
+
+    @classmethod
+    def load(
+        cls, store: VectorStore, path: str = CANONICAL_INDEX_FILE
+    ) -> "CanonicalIndex":
+        """
+        Loads the duplicate groups and checks they were built from `store`.
+
+        Raises:
+            FileNotFoundError: If the groups have not been built.
+            StaleIndexError: If the store has been rebuilt since.
+        """
+        with np.load(path) as data:
+            index = cls(data["canonical_of"], json.loads(str(data["meta"])))
+        if (
+            index.meta.get("database_sha256") != store.manifest["database_sha256"]
+            or index.meta.get("row_count") != store.row_count
+        ):
+            raise StaleIndexError(
+                f"Duplicate groups '{path}' were built from a different vector store. Rebuild them."
+            )
+        return index
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    candidate_vectors: np.ndarray,
+    k: int,
+    lambda_: float = DEFAULT_MMR_LAMBDA,
+) -> np.ndarray:
+    """
+    Maximal marginal relevance over a candidate pool.
+
+    Each step picks the candidate maximizing
+    lambda_ * relevance - (1 - lambda_) * (max similarity to those already picked),
+    using one (C x C) similarity matrix and an incrementally updated maximum.
+
+    Args:
+        relevance: (C,) relevance of each candidate to the query.
+        candidate_vectors: (C, D) L2-normalized candidate embeddings.
+        k: Number of candidates to pick.
+        lambda_: 1.0 is pure relevance ranking; lower values favour diversity.
+
+    Returns:
+        Positions into the candidate pool, in selection order.
+    """
+    n_candidates = len(relevance)
+    k = min(k, n_candidates)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    similarities = candidate_vectors @ candidate_vectors.T
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarities[selected[0]].copy()
+    for _ in range(k - 1):
+        scores = lambda_ * relevance - (1 - lambda_) * max_similarity
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(max_similarity, similarities[best], out=max_similarity)
+    return np.array(selected, dtype=np.int64)
+
+
+if __name__ == "__main__":
+    threshold = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DUPLICATE_THRESHOLD
+    store = VectorStore.open(DATABASE_FILE, MODEL_NAME_EMBED)
+    start = time.perf_counter()
+    index = CanonicalIndex.build(store, threshold)
+    index.save()
+    sizes = index.cluster_sizes()
+    print(
+        f"✅ {store.row_count} rows -> {len(index.canonical_rows)} canonical entries "
+        f"(threshold {threshold}, largest group {sizes.max()}) in "
+        f"{time.perf_counter() - start:.1f}s -> '{CANONICAL_INDEX_FILE}'"
+    )
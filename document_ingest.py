@@ -0,0 +1,335 @@
+"""
+Extracts the text of uploaded factual documents (PDF, DOCX, TXT).
+
+Each file is extracted in its own worker thread, and pages are streamed back
+as they are extracted. pypdf is pure Python and holds the GIL, so threads
+alone would run PDFs one at a time and stall the UI; PDFs are instead parsed
+in a pool of worker processes, and their pages are streamed once the whole
+file is done. The extracted pages are cached on disk keyed on the SHA-256 of
+the file's bytes, so uploading the same exhibit again costs a hash and one
+lookup.
+
+PDF support needs `pypdf` and DOCX support needs `python-docx`. Both are
+optional: without them, those files come back with an error instead of text.
+DOCX files have no fixed pages; they are split at explicit page breaks.
+
+    python document_ingest.py exhibit1.pdf witness_statement.docx ...
+"""
+
+import hashlib
+import io
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+
+import tracing
+from response_cache import ResponseCache
+from sqlite_cache import LazyDefault
+
+DOCUMENT_CACHE_FILE = "document_cache.sqlite"
+DOCUMENT_CACHE_MAX_ENTRIES = 500
+DOCUMENT_CACHE_TTL_SECONDS = 30 * 24 * 3600
+# Bump when extraction changes, so cached text from the old extractor is ignored.
+EXTRACTOR_VERSION = 1
+SUPPORTED_TYPES = ("pdf", "docx", "txt")
+PAGE_SEPARATOR = "\n\n"
+
+
+@dataclass(slots=True)
+class DocumentPage:
+    """One page of text, as streamed while its document is extracted."""
+
+    document: str
+    number: int  # 1-based
+    text: str
+
+
+@dataclass(slots=True)
+class IngestedDocument:
+    """A file's extracted pages plus what it cost to get them."""
+
+    name: str
+    sha256: str
+    size_bytes: int
+    pages: list = field(default_factory=list)
+    seconds: float = 0.0
+    cached: bool = False
+    error: str = None
+    started: float = 0.0  # perf_counter, for tracing
+
+    @property
+    def kind(self) -> str:
+        return os.path.splitext(self.name)[1].lstrip(".").lower()
+
+    @property
+    def text(self) -> str:
+        return PAGE_SEPARATOR.join(page for page in self.pages if page.strip())
+
+    def report_row(self) -> dict:
+        return {
+            "file": self.name,
+            "type": self.kind,
+            "size_kb": round(self.size_bytes / 1024, 1),
+            "pages": len(self.pages),
+            "characters": sum(len(page) for page in self.pages),
+            "seconds": round(self.seconds, 3),
+            "cached": self.cached,
+            "error": self.error or "",
+        }
+
+
+def _pdf_pages(data: bytes):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("PDF support needs the 'pypdf' package.") from None
+    for page in PdfReader(io.BytesIO(data)).pages:
+        yield page.extract_text() or ""
+
+
+def _pdf_page_list(data: bytes) -> list:
+    """All of a PDF's page texts at once, for running in a worker process."""
+    return list(_pdf_pages(data))
+
+
+def _docx_pages(data: bytes):
+    try:
+        import docx
+    except ImportError:
+        raise RuntimeError("DOCX support needs the 'python-docx' package.") from None
+    lines = []
+    for paragraph in docx.Document(io.BytesIO(data)).paragraphs:
+        lines.append(paragraph.text)
+        # Explicit breaks, plus the ones Word recorded when it last laid out the file.
+        if paragraph._element.xpath('.//w:br[@w:type="page"]') or getattr(
+            paragraph, "contains_page_break", False
+        ):
+            yield "\n".join(lines)
+            lines = []
+    if lines:
+        yield "\n".join(lines)
+
+
+def _txt_pages(data: bytes):
+    yield data.decode("utf-8", errors="replace")
+
+
+_EXTRACTORS = {"pdf": _pdf_pages, "docx": _docx_pages, "txt": _txt_pages}
+
+
+def extract_pages(name: str, data: bytes):
+    """
+    Yields the text of each page of a file, by its extension.
+
+    Raises:
+        ValueError: If the file type is not supported.
+        RuntimeError: If the library for the file type is not installed.
+    """
+    kind = os.path.splitext(name)[1].lstrip(".").lower()
+    if kind not in _EXTRACTORS:
+        raise ValueError(
+            f"Unsupported file type '.{kind}'; expected one of {', '.join(SUPPORTED_TYPES)}."
+        )
+    yield from _EXTRACTORS[kind](data)
+
+
+def document_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def ingest_document(
+    name: str,
+    data: bytes,
+    cache: ResponseCache = None,
+    on_page=None,
+    processes: ProcessPoolExecutor = None,
+) -> IngestedDocument:
+    """
+    Extracts one file, from the cache when its bytes were seen before.
+
+    Args:
+        on_page: Called with each DocumentPage as it is extracted (or loaded).
+        processes: If given, PDFs are parsed on this pool instead of the
+            calling thread.
+
+    Returns:
+        The IngestedDocument; extraction failures are recorded in `error`
+        rather than raised.
+    """
+    started = time.perf_counter()
+    document = IngestedDocument(
+        name=name, sha256=document_key(data), size_bytes=len(data), started=started
+    )
+    cache_key = f"{document.sha256}:{document.kind}:v{EXTRACTOR_VERSION}"
+    cached = cache.get(cache_key) if cache is not None else None
+    if cached is not None:
+        document.pages, document.cached = cached, True
+        for number, text in enumerate(cached, 1):
+            if on_page is not None:
+                on_page(DocumentPage(name, number, text))
+    else:
+        try:
+            if processes is not None and document.kind == "pdf":
+                pages = processes.submit(_pdf_page_list, data).result()
+            else:
+                pages = extract_pages(name, data)
+            for number, text in enumerate(pages, 1):
+                document.pages.append(text)
+                if on_page is not None:
+                    on_page(DocumentPage(name, number, text))
+        except Exception as e:
+            document.error = str(e) or type(e).__name__
+        else:
+            if cache is not None:
+                cache.put(cache_key, document.pages)
+    document.seconds = time.perf_counter() - started
+    return document
+
+
+class IngestionStream:
+    """
+    Extracts files in parallel, one per worker thread (with PDFs parsed on the
+    shared process pool), and iterates over their DocumentPages as they are
+    extracted. After iteration, `documents` holds
+    the IngestedDocuments in the order the files were given.
+
+    When iterated under a trace, each file is recorded as an
+    "ingest.document" span.
+    """
+
+    def __init__(
+        self,
+        files: list,
+        workers: int = None,
+        cache: ResponseCache = None,
+        use_cache: bool = True,
+    ):
+        """
+        Args:
+            files: (name, bytes) pairs.
+            workers: Threads to extract with; defaults to one per file, up to
+                the number of cores.
+            cache: Cache of extracted pages; defaults to DOCUMENT_CACHE_FILE.
+        """
+        self.files = list(files)
+        self.workers = workers or min(len(self.files), os.cpu_count() or 1) or 1
+        self.cache = cache
+        if self.cache is None and use_cache:
+            self.cache = get_default_document_cache()
+        self.documents = None
+
+    def __iter__(self):
+        events = queue.Queue()
+        documents = [None] * len(self.files)
+
+        def extract(index, name, data):
+            try:
+                documents[index] = ingest_document(
+                    name, data, self.cache, events.put, processes
+                )
+            except Exception as e:  # e.g. the cache file is unusable
+                documents[index] = IngestedDocument(
+                    name,
+                    document_key(data),
+                    len(data),
+                    error=str(e),
+                    started=time.perf_counter(),
+                )
+            finally:
+                events.put(index)
+
+        processes = None
+        if any(name.lower().endswith(".pdf") for name, _ in self.files):
+            processes = _pdf_processes.get()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for index, (name, data) in enumerate(self.files):
+                pool.submit(extract, index, name, data)
+            remaining = len(self.files)
+            while remaining:
+                event = events.get()
+                if isinstance(event, DocumentPage):
+                    yield event
+                    continue
+                remaining -= 1
+                document = documents[event]
+                trace = tracing.current_trace()
+                if trace is not None:
+                    trace.record(
+                        "ingest.document",
+                        document.started,
+                        document.started + document.seconds,
+                        file=document.name,
+                        pages=len(document.pages),
+                        bytes=document.size_bytes,
+                        cached=document.cached,
+                    )
+        self.documents = documents
+
+
+def ingest_documents(files: list, **kwargs) -> list:
+    """Extracts (name, bytes) pairs in parallel; returns their IngestedDocuments."""
+    stream = IngestionStream(files, **kwargs)
+    for _ in stream:
+        pass
+    return stream.documents
+
+
+def ingestion_summary(documents: list) -> dict:
+    """Totals across a batch of IngestedDocuments."""
+    return {
+        "files": len(documents),
+        "pages": sum(len(document.pages) for document in documents),
+        "size_bytes": sum(document.size_bytes for document in documents),
+        "cached": sum(document.cached for document in documents),
+        "failed": sum(document.error is not None for document in documents),
+        # Files run in parallel, so this is the slowest file, not the sum.
+        "seconds": max((document.seconds for document in documents), default=0.0),
+    }
+
+
+_default_cache = LazyDefault(
+    lambda: ResponseCache(
+        DOCUMENT_CACHE_FILE,
+        max_entries=DOCUMENT_CACHE_MAX_ENTRIES,
+        ttl_seconds=DOCUMENT_CACHE_TTL_SECONDS,
+    )
+)
+
+
+def get_default_document_cache() -> ResponseCache:
+    """Returns the process-wide cache backed by DOCUMENT_CACHE_FILE."""
+    return _default_cache.get()
+
+
+# Spawned rather than forked, as the app runs other threads.
+_pdf_processes = LazyDefault(
+    lambda: ProcessPoolExecutor(os.cpu_count(), mp_context=get_context("spawn"))
+)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python document_ingest.py FILE [FILE ...]")
+        sys.exit(1)
+    files = []
+    for path in sys.argv[1:]:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+    documents = ingest_documents(files)
+    for document in documents:
+        row = document.report_row()
+        status = f"❌ {row['error']}" if document.error else "✅"
+        print(
+            f"{status} {row['file']}: {row['size_kb']:,} KB, {row['pages']} pages, "
+            f"{row['characters']:,} chars in {row['seconds']:.2f}s"
+            + (" (cached)" if document.cached else "")
+        )
+    summary = ingestion_summary(documents)
+    print(
+        f"📄 {summary['files']} files, {summary['pages']} pages, "
+        f"{summary['size_bytes'] / 1e6:.1f} MB in {summary['seconds']:.2f}s"
+    )
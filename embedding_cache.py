@@ -0,0 +1,143 @@
+"""
+Persistent, cross-session cache for text embeddings.
+
+Vectors are stored as float32 blobs in a small SQLite file keyed on
+(embedding model name, hash of the whitespace-normalized text), so the app and
+the notebooks share one cache that survives restarts. The cache is capped at
+`max_entries` rows; the least recently used rows are evicted first.
+"""
+
+import hashlib
+import re
+import time
+
+import numpy as np
+
+from sqlite_cache import LazyDefault, SQLiteLRUCache
+
+EMBEDDING_CACHE_FILE = "embedding_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 20_000
+
+
+def normalize_text(text: str) -> str:
+    """Collapses runs of whitespace and strips the ends."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache(SQLiteLRUCache):
+    """SQLite-backed LRU cache of float32 embedding vectors. Thread-safe."""
+
+    TABLE = "embeddings"
+    COLUMNS = """
+        model_name TEXT NOT NULL,
+        text_hash TEXT NOT NULL,
+        vector BLOB NOT NULL,
+        last_used REAL NOT NULL,
+        PRIMARY KEY (model_name, text_hash)
+    """
+
+    def __init__(
+        self, path: str = EMBEDDING_CACHE_FILE, max_entries: int = DEFAULT_MAX_ENTRIES
+    ):
+        super().__init__(path, max_entries)
+
+    def get_many(self, model_name: str, texts: list) -> list:
+        """Returns a cached float32 vector or None for each text, refreshing LRU order."""
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique), 500):
+                chunk = unique[start : start + 500]
+                rows = self._conn.execute(
+                    "SELECT text_hash, vector FROM embeddings WHERE model_name = ? "
+                    f"AND text_hash IN ({', '.join('?' * len(chunk))})",
+                    [model_name, *chunk],
+                ).fetchall()
+                found.update(
+                    (h, np.frombuffer(blob, dtype=np.float32)) for h, blob in rows
+                )
+            if found:
+                now = time.time()
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? "
+                        "WHERE model_name = ? AND text_hash = ?",
+                        [(now, model_name, h) for h in found],
+                    )
+            results = [found.get(h) for h in hashes]
+            hit_count = sum(vector is not None for vector in results)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, model_name: str, texts: list, vectors) -> None:
+        """Stores vectors as float32 and evicts least recently used rows over the cap."""
+        now = time.time()
+        rows = [
+            (model_name, text_hash(text), np.asarray(vector, np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows
+            )
+            self._evict()
+
+    def get_or_embed(self, model_name: str, texts: list, embed_fn) -> np.ndarray:
+        """
+        Returns a (len(texts), D) float32 array, calling `embed_fn` only for texts
+        that are not cached yet. Duplicate texts within a call are embedded once.
+
+        Args:
+            model_name: The embedding model, part of the cache key.
+            texts: Texts to embed.
+            embed_fn: Callable taking a list of texts and returning one vector each.
+        """
+        cached = self.get_many(model_name, texts)
+        missing = {}
+        for text, vector in zip(texts, cached):
+            if vector is None:
+                missing.setdefault(text_hash(text), text)
+        if missing:
+            missing_texts = list(missing.values())
+            new_vectors = np.asarray(embed_fn(missing_texts), dtype=np.float32)
+            self.put_many(model_name, missing_texts, new_vectors)
+            by_hash = dict(zip(missing, new_vectors))
+            cached = [
+                by_hash[text_hash(text)] if vector is None else vector
+                for text, vector in zip(texts, cached)
+            ]
+        return np.vstack(cached) if cached else np.empty((0, 0), dtype=np.float32)
+
+
+_default_cache = LazyDefault(EmbeddingCache)
+
+
+def get_default_cache() -> EmbeddingCache:
+    """Returns the process-wide cache backed by EMBEDDING_CACHE_FILE."""
+    return _default_cache.get()
+
+
+def set_default_cache(cache: EmbeddingCache) -> None:
+    """Replaces the process-wide cache, e.g. with a scratch file for benchmarks."""
+    _default_cache.set(cache)
+
+
+def embed_with_cache(
+    embedding_model, model_name: str, texts: list, cache: EmbeddingCache = None
+) -> np.ndarray:
+    """
+    Drop-in for `embedding_model.get_embeddings(texts)` that goes through the
+    cache and returns a (len(texts), D) float32 array instead of response objects.
+    """
+    cache = cache or get_default_cache()
+    return cache.get_or_embed(
+        model_name,
+        texts,
+        lambda batch: [e.values for e in embedding_model.get_embeddings(batch)],
+    )
@@ -0,0 +1,250 @@
+"""
+Incremental, batched and resumable embedding indexer for the argument database.
+
+Each CSV row's `embedding_text` is hashed. Rows whose hash is already in the
+vector store are reused, so only new or changed rows are embedded, in API-sized
+batches with a bounded number of concurrent requests. Every finished batch is
+checkpointed to SQLite, so a crashed run resumes where it stopped. Rows are never
+skipped or padded: if any row still fails after retries, nothing is written and
+re-running picks up from the checkpoint.
+
+When the CSV only gained rows at the end, the new vectors are appended to the
+existing store file; otherwise the store is rewritten in CSV order.
+
+    python indexer.py [--workers 8] [--batch-size N] [--full]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from embedding_cache import EmbeddingCache, text_hash
+from vector_store import (
+    DATABASE_FILE,
+    MANIFEST_FILE,
+    MODEL_NAME_EMBED,
+    STORE_FILE,
+    append_to_vector_store,
+    build_vector_store,
+    write_manifest,
+)
+
+ROW_HASHES_FILE = "arguments_embeddings.rowhashes.npy"
+CHECKPOINT_FILE = "indexer_checkpoint.sqlite"
+
+# Maximum number of texts accepted by a single get_embeddings request.
+# gemini-embedding-001 only takes one input per call; older text-embedding
+# models accept up to 250.
+EMBED_BATCH_LIMITS = {"gemini-embedding-001": 1}
+DEFAULT_EMBED_BATCH_LIMIT = 250
+DEFAULT_WORKERS = 8
+MAX_RETRIES = 5
+
+
+def embed_batch_limit(model_name: str) -> int:
+    return EMBED_BATCH_LIMITS.get(model_name, DEFAULT_EMBED_BATCH_LIMIT)
+
+
+def build_embedding_text(db_df: pd.DataFrame) -> pd.Series:
+    """Combines the argument fields into the text that is embedded for each row."""
+    return (
+        "Argument: "
+        + db_df["argument_summary"].fillna("")
+        + " | Legal Basis: "
+        + db_df["legal_basis"].fillna("")
+        + " | Keywords: "
+        + db_df["key_keywords"].fillna("")
+        + " | Tribunal Reasoning: "
+        + db_df["tribunal_reasoning"].fillna("")
+    )
+
+
+def embedding_batches(texts: list, model_name: str = MODEL_NAME_EMBED) -> list:
+    """Splits texts into consecutive lists of at most the model's request limit."""
+    batch_size = embed_batch_limit(model_name)
+    return [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+
+
+def embed_with_retry(embedding_model, texts: list, before_request=None) -> list:
+    """
+    Calls get_embeddings for one batch with exponential backoff on any error.
+
+    Args:
+        before_request: Called before every attempt, e.g. a rate limiter's
+            blocking acquire().
+
+    Returns:
+        One list of floats per text.
+    """
+    for attempt in range(MAX_RETRIES):
+        if before_request is not None:
+            before_request()
+        try:
+            return [e.values for e in embedding_model.get_embeddings(texts)]
+        except Exception:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(2**attempt)
+
+
+def _load_existing(model_name: str, store_file: str, manifest_file: str) -> tuple:
+    """Returns (row hashes, normalized vectors) of the current store, or empty arrays."""
+    if not all(os.path.exists(p) for p in (store_file, manifest_file, ROW_HASHES_FILE)):
+        return np.array([], dtype="S64"), None
+    vectors = np.load(store_file, mmap_mode="r")
+    row_hashes = np.load(ROW_HASHES_FILE)
+    with open(manifest_file, "r", encoding="utf-8") as f:
+        manifest_model = json.load(f).get("model_name")
+    if manifest_model != model_name or len(row_hashes) != len(vectors):
+        return np.array([], dtype="S64"), None
+    return row_hashes, vectors
+
+
+def run_indexer(
+    embedding_model,
+    database_file: str = DATABASE_FILE,
+    model_name: str = MODEL_NAME_EMBED,
+    store_file: str = STORE_FILE,
+    manifest_file: str = MANIFEST_FILE,
+    batch_size: int = None,
+    workers: int = DEFAULT_WORKERS,
+    full: bool = False,
+) -> dict:
+    """
+    Brings the vector store in line with `database_file`, embedding only new or
+    changed rows.
+
+    Args:
+        embedding_model: A TextEmbeddingModel (anything with get_embeddings).
+        batch_size: Texts per request; defaults to the model's API limit.
+        workers: Maximum number of concurrent embedding requests.
+        full: Ignore the existing store and re-embed every row.
+
+    Returns:
+        Counts of reused, embedded and resumed rows.
+
+    Raises:
+        RuntimeError: If some rows could not be embedded. Nothing is written;
+            re-running resumes from the checkpoint.
+    """
+    batch_size = batch_size or embed_batch_limit(model_name)
+    db_df = pd.read_csv(database_file)
+    texts = build_embedding_text(db_df).tolist()
+    row_hashes = np.array([text_hash(text) for text in texts], dtype="S64")
+
+    if full:
+        old_hashes, old_vectors = np.array([], dtype="S64"), None
+    else:
+        old_hashes, old_vectors = _load_existing(model_name, store_file, manifest_file)
+    old_row_of = {h: i for i, h in enumerate(old_hashes)}
+
+    checkpoint = EmbeddingCache(CHECKPOINT_FILE, max_entries=sys.maxsize)
+    todo = list(
+        {h: i for i, h in enumerate(row_hashes) if h not in old_row_of}.values()
+    )
+    resumed = checkpoint.get_many(model_name, [texts[i] for i in todo])
+    pending = [i for i, vector in zip(todo, resumed) if vector is None]
+    print(
+        f"{len(texts)} rows: {len(texts) - len(todo)} reused, "
+        f"{len(todo) - len(pending)} resumed from checkpoint, {len(pending)} to embed."
+    )
+
+    failed = []
+    batches = [pending[i : i + batch_size] for i in range(0, len(pending), batch_size)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(embed_with_retry, embedding_model, [texts[i] for i in b]): b
+            for b in batches
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            batch = futures[future]
+            try:
+                checkpoint.put_many(
+                    model_name, [texts[i] for i in batch], future.result()
+                )
+            except Exception as e:
+                failed.extend(batch)
+                print(f"Batch starting at row {batch[0]} failed: {e}")
+            if done % 100 == 0 or done == len(batches):
+                print(f"  embedded {done}/{len(batches)} batches")
+
+    if failed:
+        raise RuntimeError(
+            f"{len(failed)} rows could not be embedded (first: row {min(failed)}). "
+            "Nothing was written; re-run to resume from the checkpoint."
+        )
+
+    fresh = dict(
+        zip(row_hashes[todo], checkpoint.get_many(model_name, [texts[i] for i in todo]))
+    )
+
+    def vector_for(row: int) -> np.ndarray:
+        old_row = old_row_of.get(row_hashes[row])
+        return fresh[row_hashes[row]] if old_row is None else old_vectors[old_row]
+
+    # If the stored rows are an unchanged prefix of the CSV, append in place.
+    n_old = len(old_hashes)
+    if old_vectors is not None and np.array_equal(row_hashes[:n_old], old_hashes):
+        if n_old < len(texts):
+            append_to_vector_store(
+                np.vstack([vector_for(i) for i in range(n_old, len(texts))]),
+                database_file,
+                model_name,
+                store_file,
+                manifest_file,
+            )
+        else:
+            # Same embedded text, but other columns may have changed.
+            write_manifest(old_vectors.shape, database_file, model_name, manifest_file)
+    else:
+        vectors = np.vstack([vector_for(i) for i in range(len(texts))])
+        build_vector_store(
+            vectors,
+            database_file,
+            model_name,
+            store_file,
+            manifest_file,
+            expected_rows=len(db_df),
+        )
+    np.save(ROW_HASHES_FILE, row_hashes)
+    checkpoint.close()
+    os.remove(CHECKPOINT_FILE)
+    return {
+        "rows": len(texts),
+        "reused": len(texts) - len(todo),
+        "resumed": len(todo) - len(pending),
+        "embedded": len(pending),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database", default=DATABASE_FILE)
+    parser.add_argument("--model", default=MODEL_NAME_EMBED)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument(
+        "--full", action="store_true", help="Re-embed every row from scratch."
+    )
+    args = parser.parse_args()
+
+    import vertexai
+    from vertexai.language_models import TextEmbeddingModel
+
+    vertexai.init(project="hack-thelaw25cam-586", location="us-central1")
+    start = time.perf_counter()
+    counts = run_indexer(
+        TextEmbeddingModel.from_pretrained(args.model),
+        database_file=args.database,
+        model_name=args.model,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        full=args.full,
+    )
+    print(f"✅ Indexed {counts} in {time.perf_counter() - start:.1f}s")
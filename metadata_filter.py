@@ -0,0 +1,76 @@
+"""
+Structured metadata filters for precedent search, resolved before any scoring.
+
+`FacetIndex` precomputes one packed row bitmap per value of each facet column
+(`party`, `document_type`, `court_followed` as the outcome, `case_title`). A
+filter such as {"court_followed": ["Yes", "Partial/Deferred"], "party": "Claimant"}
+ORs the bitmaps of the values within a facet and ANDs across facets, giving the
+row subset that search then scans. The more selective the filter, the fewer
+rows are scored.
+
+The database has no year column; any further categorical column (e.g. a year
+added to the CSV) can be made filterable by adding it to FILTER_COLUMNS.
+"""
+
+import numpy as np
+import pandas as pd
+
+FILTER_COLUMNS = ["party", "document_type", "court_followed", "case_title"]
+
+
+class FacetIndex:
+    """Packed per-value row bitmaps for each filterable column."""
+
+    def __init__(self, bitmaps: dict, row_count: int):
+        self.bitmaps = bitmaps  # column -> {value: packed uint8 bitmap}
+        self.row_count = row_count
+
+    @classmethod
+    def build(cls, db_df: pd.DataFrame, columns: list = FILTER_COLUMNS):
+        bitmaps = {}
+        for column in columns:
+            values = db_df[column].astype("category")
+            codes = values.cat.codes.to_numpy()
+            bitmaps[column] = {
+                str(value): np.packbits(codes == code)
+                for code, value in enumerate(values.cat.categories)
+            }
+        return cls(bitmaps, len(db_df))
+
+    def values(self, column: str) -> list:
+        """The filterable values of `column`, e.g. to populate a multiselect."""
+        return sorted(self.bitmaps[column])
+
+    def resolve(self, filters: dict):
+        """
+        Resolves filters to the sorted indices of the matching rows.
+
+        Args:
+            filters: Column -> value or list of accepted values. Values not in
+                the database match nothing; an empty list leaves the column
+                unfiltered.
+
+        Returns:
+            An int64 index array, or None when `filters` restricts nothing.
+
+        Raises:
+            ValueError: If a column is not filterable.
+        """
+        combined = None
+        for column, accepted in (filters or {}).items():
+            if column not in self.bitmaps:
+                raise ValueError(
+                    f"Cannot filter on '{column}'. Filterable columns: {', '.join(self.bitmaps)}"
+                )
+            if isinstance(accepted, str):
+                accepted = [accepted]
+            if not accepted:
+                continue
+            empty = np.zeros((self.row_count + 7) // 8, dtype=np.uint8)
+            column_bitmap = empty
+            for value in accepted:
+                column_bitmap = column_bitmap | self.bitmaps[column].get(value, empty)
+            combined = column_bitmap if combined is None else combined & column_bitmap
+        if combined is None:
+            return None
+        return np.flatnonzero(np.unpackbits(combined, count=self.row_count))
@@ -0,0 +1,346 @@
+"""
+Quantized copies of the vector store for a fast first-pass scan, with exact rescoring.
+
+Three representations, each a small in-memory array next to the float32 store:
+
+- "int8": scalar quantization with one scale per dimension (4x smaller). A
+  query is scored as (query * scales) @ codes.
+- "binary": one sign bit per dimension (32x smaller), scored by popcount
+  Hamming distance; D - 2 * hamming is the dot product of the sign vectors.
+- "truncated": the first `TRUNCATED_DIMENSION` dimensions of each vector,
+  re-normalized (12x smaller for 3072-dimensional vectors). gemini-embedding-001
+  is trained Matryoshka-style, so a prefix of the vector is itself a usable,
+  lower-resolution embedding. Queries are truncated the same way.
+
+Search scans the quantized codes, keeps the best `rescore` candidates and
+rescores only those rows from the memory-mapped float32 store, so final scores
+are exact cosine similarities.
+
+    python quantization.py build [int8|binary|truncated] [truncated dimension]
+    python quantization.py bench [k]
+"""
+
+import json
+import sys
+import time
+
+import numpy as np
+
+from vector_store import (
+    DATABASE_FILE,
+    MODEL_NAME_EMBED,
+    VectorStore,
+    StaleIndexError,
+    normalize_rows,
+    top_k_indices,
+)
+
+QUANTIZED_INDEX_FILES = {
+    "int8": "arguments_embeddings.int8.npz",
+    "binary": "arguments_embeddings.binary.npz",
+    "truncated": "arguments_embeddings.truncated.npz",
+}
+DEFAULT_RESCORE_CANDIDATES = 200
+# Leading dimensions kept by the "truncated" first pass.
+TRUNCATED_DIMENSION = 256
+# Prefix lengths compared by `python quantization.py bench`.
+BENCH_TRUNCATED_DIMENSIONS = (128, 256, 512, 768)
+# Small enough that each int8 chunk converted to float32 stays in cache.
+SCAN_CHUNK_ROWS = 256
+
+
+def _popcount_rows(bits: np.ndarray) -> np.ndarray:
+    """Number of set bits in each row of a uint8/uint64 array."""
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(bits).sum(axis=-1, dtype=np.int32)
+    as_bytes = bits.view(np.uint8)
+    return np.unpackbits(as_bytes, axis=-1).sum(axis=-1, dtype=np.int32)
+
+
+class QuantizedIndex:
+    """
+    A compact copy of every row of a vector store, for the first-pass scan.
+
+    `kind` is "int8" (per-dimension scaled int8 codes, with `scales`),
+    "binary" (packed sign bits) or "truncated" (float32 rows of the first
+    meta["truncated_dimension"] dimensions, re-normalized; `scales` is empty).
+    """
+
+    def __init__(self, kind: str, codes: np.ndarray, scales: np.ndarray, meta: dict):
+        if kind not in QUANTIZED_INDEX_FILES:
+            raise ValueError(
+                f"Unknown quantization '{kind}'. Use 'int8', 'binary' or 'truncated'."
+            )
+        self.kind = kind
+        self.codes = codes
+        self.scales = scales
+        self.meta = meta
+        # Packed bits compare 8 bytes at a time when the row length allows it.
+        if kind == "binary" and codes.shape[1] % 8 == 0:
+            self._words = np.ascontiguousarray(codes).view(np.uint64)
+        else:
+            self._words = codes
+
+    @classmethod
+    def build(
+        cls,
+        store: VectorStore,
+        kind: str = "int8",
+        truncated_dimension: int = TRUNCATED_DIMENSION,
+    ) -> "QuantizedIndex":
+        meta = {
+            "model_name": store.manifest["model_name"],
+            "database_sha256": store.manifest["database_sha256"],
+            "row_count": store.row_count,
+            "dimension": store.dimension,
+        }
+        if kind == "binary":
+            codes = np.empty(
+                (store.row_count, (store.dimension + 7) // 8), dtype=np.uint8
+            )
+            for start in range(0, store.row_count, SCAN_CHUNK_ROWS):
+                chunk = np.asarray(store.vectors[start : start + SCAN_CHUNK_ROWS])
+                codes[start : start + len(chunk)] = np.packbits(chunk > 0, axis=1)
+            return cls(kind, codes, np.empty(0, dtype=np.float32), meta)
+        if kind == "truncated":
+            meta["truncated_dimension"] = min(truncated_dimension, store.dimension)
+            codes = np.empty(
+                (store.row_count, meta["truncated_dimension"]), dtype=np.float32
+            )
+            for start in range(0, store.row_count, SCAN_CHUNK_ROWS):
+                chunk = store.vectors[start : start + SCAN_CHUNK_ROWS]
+                codes[start : start + len(chunk)] = normalize_rows(
+                    chunk[:, : meta["truncated_dimension"]]
+                )
+            return cls(kind, codes, np.empty(0, dtype=np.float32), meta)
+
+        max_abs = np.zeros(store.dimension, dtype=np.float32)
+        for start in range(0, store.row_count, SCAN_CHUNK_ROWS):
+            chunk = np.abs(store.vectors[start : start + SCAN_CHUNK_ROWS])
+            np.maximum(max_abs, chunk.max(axis=0), out=max_abs)
+        scales = np.where(max_abs > 0, max_abs / 127, 1.0).astype(np.float32)
+        codes = np.empty((store.row_count, store.dimension), dtype=np.int8)
+        for start in range(0, store.row_count, SCAN_CHUNK_ROWS):
+            chunk = np.asarray(store.vectors[start : start + SCAN_CHUNK_ROWS])
+            codes[start : start + len(chunk)] = np.clip(
+                np.rint(chunk / scales), -127, 127
+            )
+        return cls(kind, codes, scales, meta)
+
+    @property
+    def label(self) -> str:
+        """The kind, with the dimension for truncated vectors."""
+        if self.kind == "truncated":
+            return f"truncated-{self.meta['truncated_dimension']}"
+        return self.kind
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def save(self, path: str = None):
+        np.savez(
+            path or QUANTIZED_INDEX_FILES[self.kind],
+            codes=self.codes,
+            scales=self.scales,
+            meta=np.array(json.dumps({**self.meta, "kind": self.kind})),
+        )
+
+    @classmethod
+    def load(
+        cls, store: VectorStore, kind: str = "int8", path: str = None
+    ) -> "QuantizedIndex":
+        """
+        Loads quantized codes and checks they were built from `store`.
+
+        Raises:
+            FileNotFoundError: If the codes have not been built.
+            StaleIndexError: If the store has been rebuilt since.
+        """
+        path = path or QUANTIZED_INDEX_FILES[kind]
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            index = cls(meta.pop("kind"), data["codes"], data["scales"], meta)
+        if (
+            index.meta.get("database_sha256") != store.manifest["database_sha256"]
+            or index.meta.get("row_count") != store.row_count
+        ):
+            raise StaleIndexError(
+                f"Quantized index '{path}' was built from a different vector store. Rebuild it."
+            )
+        return index
+
+    def approximate_scores(self, queries: np.ndarray, rows=None) -> np.ndarray:
+        """
+        First-pass scores of normalized queries against all rows (or `rows`).
+
+        Returns:
+            A (Q, rows scanned) array; higher is more similar.
+        """
+        if self.kind == "binary":
+            words = self._words if rows is None else self._words[rows]
+            query_bits = np.packbits(queries > 0, axis=1)
+            if words.dtype == np.uint64:
+                query_bits = query_bits.view(np.uint64)
+            # D - 2 * hamming == dot product of the +-1 sign vectors.
+            return np.stack(
+                [
+                    self.meta["dimension"] - 2 * _popcount_rows(words ^ bits)
+                    for bits in query_bits
+                ]
+            )
+
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.kind == "truncated":
+            dimension = self.meta["truncated_dimension"]
+            return normalize_rows(queries[:, :dimension]) @ codes.T
+
+        scaled_queries = (queries * self.scales).T
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_CHUNK_ROWS):
+            chunk = codes[start : start + SCAN_CHUNK_ROWS].astype(np.float32)
+            scores[:, start : start + len(chunk)] = (chunk @ scaled_queries).T
+        return scores
+
+    def search(
+        self,
+        store: VectorStore,
+        query_embeddings: np.ndarray,
+        top_n: int = 5,
+        rows: np.ndarray = None,
+        rescore: int = DEFAULT_RESCORE_CANDIDATES,
+    ):
+        """
+        Quantized first pass, then exact rescoring of the best `rescore` rows.
+
+        Args:
+            rows: Optional sorted row indices to restrict the scan to.
+            rescore: Candidates rescored from the float store; 0 returns the
+                first-pass ranking and scores as they are.
+
+        Returns:
+            (indices, scores), each of shape (Q, min(top_n, rows scanned)),
+            best match first. Indices are rows of the full store.
+        """
+        queries = normalize_rows(np.atleast_2d(query_embeddings))
+        approximate = self.approximate_scores(queries, rows)
+        if rescore <= 0:
+            local = top_k_indices(approximate, top_n)
+            scores = np.take_along_axis(approximate, local, axis=-1)
+            return (local if rows is None else rows[local]), scores.astype(np.float32)
+
+        candidates = top_k_indices(approximate, max(rescore, top_n))
+        if rows is not None:
+            candidates = rows[candidates]
+        candidates.sort(axis=-1)  # Sequential reads from the memory-mapped store.
+        all_indices, all_scores = [], []
+        for query, query_candidates in zip(queries, candidates):
+            scores = store.vectors[query_candidates] @ query
+            best = top_k_indices(scores, top_n)
+            all_indices.append(query_candidates[best])
+            all_scores.append(scores[best])
+        return np.array(all_indices), np.array(all_scores)
+
+
+def benchmark(
+    store: VectorStore,
+    indexes: list,
+    k: int = 5,
+    rescore_values=(0, 50, DEFAULT_RESCORE_CANDIDATES),
+    n_queries: int = 200,
+    seed: int = 0,
+) -> list:
+    """
+    Compares quantized search against exact float32 search, using corpus rows
+    with a little noise added as queries (as ann_index.evaluate_recall does).
+
+    Returns:
+        One dict per configuration with memory in MB, mean per-query latency
+        in ms and recall@k against exact search.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(
+        store.row_count, size=min(n_queries, store.row_count), replace=False
+    )
+    queries = np.asarray(store.vectors[np.sort(rows)])
+    queries = queries + rng.normal(
+        scale=0.5 / np.sqrt(store.dimension), size=queries.shape
+    )
+
+    start = time.perf_counter()
+    exact_indices = np.vstack([store.search(query, k)[0] for query in queries])
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    report = [
+        {
+            "mode": "float32",
+            "rescore": None,
+            "memory_mb": store.vectors.nbytes / 1e6,
+            "latency_ms": exact_ms,
+            "recall": 1.0,
+        }
+    ]
+    for index in indexes:
+        for rescore in rescore_values:
+            start = time.perf_counter()
+            found = np.vstack(
+                [index.search(store, query, k, rescore=rescore)[0] for query in queries]
+            )
+            latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            hits = sum(
+                len(np.intersect1d(exact_row, found_row))
+                for exact_row, found_row in zip(exact_indices, found)
+            )
+            report.append(
+                {
+                    "mode": index.label,
+                    "rescore": rescore,
+                    "memory_mb": index.nbytes / 1e6,
+                    "latency_ms": latency_ms,
+                    "recall": hits / exact_indices.size,
+                }
+            )
+    return report
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    store = VectorStore.open(DATABASE_FILE, MODEL_NAME_EMBED)
+    if command == "build":
+        kinds = [sys.argv[2]] if len(sys.argv) > 2 else list(QUANTIZED_INDEX_FILES)
+        dimension = int(sys.argv[3]) if len(sys.argv) > 3 else TRUNCATED_DIMENSION
+        for kind in kinds:
+            start = time.perf_counter()
+            index = QuantizedIndex.build(store, kind, truncated_dimension=dimension)
+            index.save()
+            print(
+                f"✅ Built {index.label} codes for {store.row_count} vectors "
+                f"({index.nbytes / 1e6:.1f} MB) in {time.perf_counter() - start:.1f}s "
+                f"-> '{QUANTIZED_INDEX_FILES[kind]}'"
+            )
+    elif command == "bench":
+        k = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        indexes = []
+        for kind in ("int8", "binary"):
+            try:
+                indexes.append(QuantizedIndex.load(store, kind))
+            except (FileNotFoundError, StaleIndexError) as e:
+                print(f"Skipping {kind}: {e}")
+        # Truncated copies are cheap to build, so compare several prefix lengths.
+        indexes.extend(
+            QuantizedIndex.build(store, "truncated", truncated_dimension=dimension)
+            for dimension in BENCH_TRUNCATED_DIMENSIONS
+            if dimension < store.dimension
+        )
+        print(f"Recall@{k} vs exact search ({store.row_count} vectors):")
+        for row in benchmark(store, indexes, k=k):
+            label = (
+                row["mode"]
+                if row["rescore"] is None
+                else (f"{row['mode']} rescore={row['rescore']}")
+            )
+            print(
+                f"  {label:>20}  memory={row['memory_mb']:8.1f} MB  "
+                f"latency={row['latency_ms']:.3f} ms/query  recall={row['recall']:.3f}"
+            )
+    else:
+        print(f"Unknown command '{command}'. Use 'build' or 'bench'.")
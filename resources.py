@@ -0,0 +1,395 @@
+"""
+Process-wide, lazily built resources: the Vertex AI models and the search data.
+
+Every resource is built on first use, once per process, and then shared by all
+Streamlit sessions, threads and any other caller (notebooks, CLIs). Heavy
+imports (vertexai, pandas via argument_db) happen inside the builders, so
+importing this module, and the app, is cheap. A failed build is logged once and
+re-raised as ResourceUnavailable rather than retried on every rerun; the first
+use after a backoff (RETRY_AFTER_SECONDS, doubling with each consecutive
+failure) builds it again, so a transient error at startup clears by itself.
+`reset()` retries immediately.
+
+`start_warm_up()` builds everything in a background thread, so the first
+request does not pay for it; `python resources.py` does the same in the
+foreground and prints the timings.
+
+The models come from the selected backend (see backends.py): "vertex" by
+default, or "fake" for deterministic offline stand-ins, chosen with the
+ARBITRATION_BACKEND environment variable or `set_backend()`. `provide()`
+installs a prebuilt resource, e.g. a synthetic corpus for benchmarking.
+"""
+
+import functools
+import os
+import threading
+import time
+import warnings
+from dataclasses import dataclass
+
+from strategy_parsing import STRATEGY_RESPONSE_SCHEMA
+
+# --- Suppress a known, harmless warning from the Google Cloud client ---
+warnings.filterwarnings(
+    "ignore",
+    category=UserWarning,
+    module="google.cloud.aiplatform.compat.services.prediction_service_client",
+)
+
+PROJECT_ID = "hack-thelaw25cam-586"
+LOCATION = "us-central1"
+MODEL_NAME_GEN = "gemini-2.0-flash-lite-001"
+MODEL_NAME_EMBED = "gemini-embedding-001"
+DATABASE_FILE = "legal_arguments_database_merged.csv"
+
+
+def shard_count(setting: str) -> int:
+    """Parses a shard setting: a worker count, or "auto" / -1 for one per core."""
+    if setting.strip().lower() in ("auto", "-1"):
+        return os.cpu_count() or 1
+    return int(setting)
+
+
+# Exact vector scans use this many worker processes over shared-memory shards of
+# the store (sharded_search.py) when it is above 1; "auto" uses every core.
+SEARCH_SHARDS = shard_count(os.environ.get("ARBITRATION_SEARCH_SHARDS", "0"))
+# Part of the strategy response cache key, so keep every setting here. The
+# response is constrained to JSON matching STRATEGY_RESPONSE_SCHEMA.
+GENERATION_SETTINGS = {
+    "temperature": 0.4,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+    "response_mime_type": "application/json",
+    "response_schema": STRATEGY_RESPONSE_SCHEMA,
+}
+
+
+BACKENDS = ("vertex", "fake")
+BACKEND = os.environ.get("ARBITRATION_BACKEND", "vertex")
+# Keyword arguments for the fake models: {"embedding": {...}, "generation": {...}}.
+_backend_options = {}
+
+
+class ResourceUnavailable(RuntimeError):
+    """A resource could not be built; the message says why."""
+
+
+# A failed build is retried on first use after this many seconds, doubled for
+# each further consecutive failure, up to RETRY_MAX_SECONDS.
+RETRY_AFTER_SECONDS = 5.0
+RETRY_MAX_SECONDS = 300.0
+
+_registry = {}  # name -> (value, None) or (None, ResourceUnavailable)
+_failures = {}  # name -> (consecutive failures, time.monotonic() of the last)
+_builders = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _retry_delay(failures: int) -> float:
+    return min(RETRY_AFTER_SECONDS * 2 ** (failures - 1), RETRY_MAX_SECONDS)
+
+
+def _needs_build(name: str) -> bool:
+    """Not built yet, or failed and past its retry backoff."""
+    entry = _registry.get(name)
+    if entry is None:
+        return True
+    if entry[1] is None:
+        return False
+    failures, failed_at = _failures.get(name, (1, 0.0))
+    return time.monotonic() - failed_at >= _retry_delay(failures)
+
+
+def resource(build_fn):
+    """Turns a builder into a thread-safe, lazily evaluated process-wide singleton."""
+    name = build_fn.__name__
+
+    @functools.wraps(build_fn)
+    def get():
+        if _needs_build(name):
+            with _registry_lock:
+                lock = _locks.setdefault(name, threading.Lock())
+            with lock:
+                if _needs_build(name):
+                    start = time.perf_counter()
+                    try:
+                        _registry[name] = (build_fn(), None)
+                        _failures.pop(name, None)
+                        print(f"✅ Loaded {name} in {time.perf_counter() - start:.2f}s")
+                    except Exception as e:
+                        if not isinstance(e, ResourceUnavailable):
+                            e = ResourceUnavailable(f"Could not load {name}: {e}")
+                        failures = _failures.get(name, (0, 0.0))[0] + 1
+                        _failures[name] = (failures, time.monotonic())
+                        _registry[name] = (None, e)
+                        print(
+                            f"⚠️ {name} unavailable, retrying on use after "
+                            f"{_retry_delay(failures):.0f}s: {e}"
+                        )
+        value, error = _registry[name]
+        if error is not None:
+            raise error
+        return value
+
+    _builders[name] = get
+    return get
+
+
+def reset(name: str = None):
+    """Forgets one built (or failed) resource, or all of them."""
+    with _registry_lock:
+        if name is None:
+            _registry.clear()
+            _failures.clear()
+        else:
+            _registry.pop(name, None)
+            _failures.pop(name, None)
+
+
+def warm_up(names: list = None) -> dict:
+    """
+    Builds the named resources now. By default that is all of them, except
+    sharded_search while SEARCH_SHARDS leaves it off.
+
+    Returns:
+        Resource name -> error message, or None if it loaded.
+    """
+    if names is None:
+        names = [
+            name for name in _builders if name != "sharded_search" or SEARCH_SHARDS > 1
+        ]
+    errors = {}
+    for name in names:
+        try:
+            _builders[name]()
+            errors[name] = None
+        except ResourceUnavailable as e:
+            errors[name] = str(e)
+    return errors
+
+
+def provide(name: str, value):
+    """Installs a prebuilt value for a resource, instead of building it."""
+    if name not in _builders:
+        raise ValueError(f"Unknown resource '{name}'. Use one of {list(_builders)}.")
+    with _registry_lock:
+        _registry[name] = (value, None)
+        _failures.pop(name, None)
+
+
+def set_backend(name: str, embedding: dict = None, generation: dict = None):
+    """
+    Selects the model backend and forgets the models built so far.
+
+    Args:
+        name: "vertex" or "fake".
+        embedding, generation: Keyword arguments for the fake models, e.g.
+            embedding={"dimension": 768}, generation={"latency_ms": 800}.
+    """
+    global BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Use one of {BACKENDS}.")
+    BACKEND = name
+    _backend_options.clear()
+    _backend_options.update(embedding=embedding or {}, generation=generation or {})
+    for resource_name in ("vertex_ai", "reasoning_model", "embedding_model"):
+        reset(resource_name)
+
+
+def generation_model_name() -> str:
+    """Name the generation model's cached responses are keyed on, per backend."""
+    return MODEL_NAME_GEN if BACKEND == "vertex" else f"{BACKEND}/{MODEL_NAME_GEN}"
+
+
+def embedding_model_name() -> str:
+    """Name the embedding model's cached vectors are keyed on, per backend."""
+    if BACKEND == "vertex":
+        return MODEL_NAME_EMBED
+    from backends import FAKE_EMBEDDING_DIMENSION
+
+    # Fake vectors differ by dimension, so keep them apart in the cache too.
+    options = _backend_options.get("embedding", {})
+    dimension = options.get("dimension", FAKE_EMBEDDING_DIMENSION)
+    return f"{BACKEND}/{MODEL_NAME_EMBED}/{dimension}"
+
+
+_warm_up_thread = None
+
+
+def start_warm_up() -> threading.Thread:
+    """Starts warm_up() in a background thread, once per process."""
+    global _warm_up_thread
+    with _registry_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(
+                target=warm_up, name="resource-warm-up", daemon=True
+            )
+            _warm_up_thread.start()
+    return _warm_up_thread
+
+
+# ==============================================================================
+# VERTEX AI
+# ==============================================================================
+
+
+@resource
+def vertex_ai():
+    if BACKEND != "vertex":
+        raise ResourceUnavailable(f"The '{BACKEND}' backend does not use Vertex AI.")
+    import vertexai
+
+    try:
+        vertexai.init(project=PROJECT_ID, location=LOCATION)
+    except Exception as e:
+        raise ResourceUnavailable(
+            "Failed to initialize Google Cloud AI. This usually means you are not "
+            "authenticated: run `gcloud auth application-default login` and restart "
+            f"the app. Original Error: {e}"
+        )
+    return vertexai
+
+
+@resource
+def reasoning_model():
+    if BACKEND == "fake":
+        from backends import FakeGenerativeModel
+
+        return FakeGenerativeModel(**_backend_options.get("generation", {}))
+    vertex_ai()
+    from vertexai.generative_models import (
+        GenerativeModel,
+        GenerationConfig,
+        HarmCategory,
+        HarmBlockThreshold,
+    )
+
+    generation_config = GenerationConfig(**GENERATION_SETTINGS)
+    safety_settings = {
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+    }
+    try:
+        return GenerativeModel(
+            MODEL_NAME_GEN,
+            generation_config=generation_config,
+            safety_settings=safety_settings,
+        )
+    except Exception as e:
+        raise ResourceUnavailable(
+            f"Could not initialize Generative Model '{MODEL_NAME_GEN}'. It may not be available in your project. Error: {e}"
+        )
+
+
+@resource
+def embedding_model():
+    if BACKEND == "fake":
+        from backends import FakeEmbeddingModel
+
+        return FakeEmbeddingModel(**_backend_options.get("embedding", {}))
+    vertex_ai()
+    from vertexai.language_models import TextEmbeddingModel
+
+    return TextEmbeddingModel.from_pretrained(MODEL_NAME_EMBED)
+
+
+# ==============================================================================
+# SEARCH DATA
+# ==============================================================================
+
+
+@dataclass(slots=True)
+class SearchData:
+    """What lexical search needs: local files only, no network."""
+
+    row_count: int
+    result_columns: dict  # result field -> object array, gathered by fancy indexing
+    bm25_index: object
+    facet_index: object
+
+
+@dataclass(slots=True)
+class VectorIndex:
+    """The float32 vector store and its optional derived indexes."""
+
+    store: object
+    ivf_index: object = None
+    quantized_indexes: dict = None
+    canonical_index: object = None
+
+
+@resource
+def search_data() -> SearchData:
+    from argument_db import load_argument_db, SEARCH_COLUMNS
+    from bm25 import BM25Index
+    from metadata_filter import FacetIndex, FILTER_COLUMNS
+    from result_types import RESULT_COLUMNS
+
+    # Only the columns search results return or filter on, from the typed Parquet copy.
+    db_df = load_argument_db(
+        DATABASE_FILE,
+        columns=SEARCH_COLUMNS + [c for c in FILTER_COLUMNS if c not in SEARCH_COLUMNS],
+    )
+    return SearchData(
+        row_count=len(db_df),
+        result_columns={
+            name: db_df[column].astype(object).fillna("N/A").to_numpy()
+            for name, column in RESULT_COLUMNS.items()
+        },
+        bm25_index=BM25Index.load_or_build(DATABASE_FILE),
+        # Row bitmaps per facet value, so filters are resolved before scoring.
+        facet_index=FacetIndex.build(db_df),
+    )
+
+
+@resource
+def vector_index() -> VectorIndex:
+    from ann_index import IVFIndex
+    from diversity import CanonicalIndex
+    from quantization import QuantizedIndex, QUANTIZED_INDEX_FILES
+    from vector_store import VectorStore, StaleIndexError
+
+    # Normalized float32 store, memory-mapped and validated against the CSV.
+    store = VectorStore.open(
+        DATABASE_FILE, MODEL_NAME_EMBED, expected_rows=search_data().row_count
+    )
+    index = VectorIndex(store, quantized_indexes={})
+    # Optional approximate index; search falls back to exact without it.
+    try:
+        index.ivf_index = IVFIndex.load(store)
+    except (FileNotFoundError, StaleIndexError) as e:
+        print(f"IVF index unavailable, using exact search only: {e}")
+    # Optional int8 / binary / truncated codes built by quantization.py.
+    for kind in QUANTIZED_INDEX_FILES:
+        try:
+            index.quantized_indexes[kind] = QuantizedIndex.load(store, kind)
+        except (FileNotFoundError, StaleIndexError) as e:
+            print(f"{kind} codes unavailable: {e}")
+    # Optional near-duplicate groups built by diversity.py.
+    try:
+        index.canonical_index = CanonicalIndex.load(store)
+    except (FileNotFoundError, StaleIndexError) as e:
+        print(f"Duplicate groups unavailable, searching all rows: {e}")
+    return index
+
+
+@resource
+def sharded_search():
+    if SEARCH_SHARDS <= 1:
+        raise ResourceUnavailable(
+            "Sharded search is off; set SEARCH_SHARDS above 1 to enable it."
+        )
+    from sharded_search import ShardedSearch
+
+    return ShardedSearch(vector_index().store, SEARCH_SHARDS)
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    for name, error in warm_up().items():
+        print(f"  {name}: {error or 'ok'}")
+    print(f"Warm-up took {time.perf_counter() - start:.1f}s")
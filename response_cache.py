@@ -0,0 +1,94 @@
+"""
+Persistent, content-addressed cache for strategy-analysis responses.
+
+Entries are keyed on a SHA-256 of the model name, its generation settings and
+the fully rendered prompt, and store the parsed argument list as JSON in a
+small SQLite file, so identical analyses are answered from disk across
+sessions and restarts without spending tokens. Entries expire after
+`ttl_seconds`, and the cache is capped at `max_entries` rows with the least
+recently used evicted first.
+"""
+
+import hashlib
+import json
+import time
+
+from sqlite_cache import LazyDefault, SQLiteLRUCache
+
+STRATEGY_CACHE_FILE = "strategy_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 2_000
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+def response_key(model_name: str, generation_settings: dict, prompt: list) -> str:
+    """Hash of everything that determines the model's response."""
+    payload = json.dumps(
+        {"model": model_name, "config": generation_settings, "prompt": prompt},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(SQLiteLRUCache):
+    """SQLite-backed LRU cache of JSON-serializable responses with a TTL. Thread-safe."""
+
+    TABLE = "responses"
+    COLUMNS = """
+        key TEXT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        created REAL NOT NULL,
+        last_used REAL NOT NULL
+    """
+
+    def __init__(
+        self,
+        path: str = STRATEGY_CACHE_FILE,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+    ):
+        super().__init__(path, max_entries)
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str):
+        """Returns the cached value, or None if missing or expired."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT payload, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value) -> None:
+        """Stores a JSON-serializable value, dropping expired and over-cap entries."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,)
+            )
+            self._evict()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "ttl_seconds": self.ttl_seconds}
+
+
+_default_cache = LazyDefault(ResponseCache)
+
+
+def get_default_response_cache() -> ResponseCache:
+    """Returns the process-wide cache backed by STRATEGY_CACHE_FILE."""
+    return _default_cache.get()
@@ -0,0 +1,80 @@
+"""
+Typed in-process results for strategy analysis and precedent search.
+
+These are what app.py consumes directly. The JSON string form is only produced
+on request (`to_json`) for external callers.
+"""
+
+import json
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# Result field -> database column it is read from.
+RESULT_COLUMNS = {
+    "case_identifier": "case_identifier",
+    "case_title": "case_title",
+    "argument_summary": "argument_summary",
+    "judgment": "court_followed",
+    "judgment_summary": "tribunal_reasoning",
+}
+
+
+@dataclass(slots=True)
+class PrecedentResults:
+    """Top-N precedents for one query, stored as parallel column arrays, best first."""
+
+    similarity_score: np.ndarray
+    case_identifier: np.ndarray
+    case_title: np.ndarray
+    argument_summary: np.ndarray
+    judgment: np.ndarray
+    judgment_summary: np.ndarray
+    error: str = None
+
+    @classmethod
+    def empty(cls, error: str = None) -> "PrecedentResults":
+        blank = np.array([], dtype=object)
+        return cls(np.array([], dtype=np.float32), *[blank] * 5, error=error)
+
+    @classmethod
+    def from_rows(
+        cls, columns: dict, indices: np.ndarray, scores: np.ndarray
+    ) -> "PrecedentResults":
+        """Gathers result rows by fancy-indexing precomputed column arrays."""
+        return cls(scores, *(columns[name][indices] for name in RESULT_COLUMNS))
+
+    def __len__(self) -> int:
+        return len(self.similarity_score)
+
+    def to_records(self) -> list:
+        """One plain dict per precedent, in the legacy JSON field layout."""
+        names = ["similarity_score", *RESULT_COLUMNS]
+        columns = [self.similarity_score.tolist()] + [
+            getattr(self, name).tolist() for name in RESULT_COLUMNS
+        ]
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+    def to_json(self) -> str:
+        if self.error:
+            return json.dumps({"error": self.error}, indent=4)
+        return json.dumps(self.to_records(), indent=4)
+
+
+@dataclass(slots=True)
+class StrategyAnalysis:
+    """Arguments extracted from a strategy, or an error with the raw model output."""
+
+    arguments: list = field(default_factory=list)
+    error: str = None
+    raw_response: str = None
+    # Why each malformed or invalid argument in the response was skipped.
+    dropped: list = field(default_factory=list)
+
+    def to_json(self) -> str:
+        if self.error:
+            payload = {"error": self.error}
+            if self.raw_response is not None:
+                payload["raw_response"] = self.raw_response
+            return json.dumps(payload, indent=4)
+        return json.dumps(self.arguments, indent=4)
@@ -0,0 +1,223 @@
+"""
+Sharded, multi-process exact search over shared-memory partitions of the vector store.
+
+The normalized float32 matrix is split into `n_shards` contiguous row ranges,
+each copied once into its own shared-memory block. A pool of worker
+processes (one per shard by default, i.e. per core) attaches to the blocks
+without copying. A query batch is scored against every shard in parallel;
+each shard returns its local top-k and the parent merges them into the global
+top-k, so results are identical to VectorStore.search.
+
+Workers run with single-threaded BLAS, so parallelism comes from the shards
+and does not oversubscribe the cores.
+
+    python sharded_search.py bench [rows] [dimension]
+"""
+
+import atexit
+import os
+import sys
+import time
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from vector_store import VectorStore, normalize_rows, top_k_indices
+
+# Thread-count variables read by the common BLAS builds when numpy is imported.
+_BLAS_THREAD_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+COPY_CHUNK_ROWS = 16_384
+
+# --- Worker side: shard blocks this process has attached to ---
+_attached = {}  # block name -> (SharedMemory, ndarray view)
+
+
+def _shard_vectors(name: str, shape: tuple) -> np.ndarray:
+    if name not in _attached:
+        block = SharedMemory(name=name)
+        _attached[name] = (block, np.ndarray(shape, dtype=np.float32, buffer=block.buf))
+    return _attached[name][1]
+
+
+def _search_shard(name, shape, offset, queries, top_n, local_rows):
+    """Local top-n of one shard, as global row indices and scores."""
+    vectors = _shard_vectors(name, shape)
+    if local_rows is not None:
+        vectors = vectors[local_rows]
+    similarities = queries @ vectors.T
+    indices = top_k_indices(similarities, top_n)
+    scores = np.take_along_axis(similarities, indices, axis=-1)
+    if local_rows is not None:
+        indices = local_rows[indices]
+    return indices + offset, scores
+
+
+def _ping(_):
+    return os.getpid()
+
+
+class ShardedSearch:
+    """A process pool scoring query batches against shared-memory shards of a store."""
+
+    def __init__(self, store: VectorStore, n_shards: int = None):
+        self.n_shards = max(1, min(n_shards or os.cpu_count() or 1, store.row_count))
+        self.row_count = store.row_count
+        self.dimension = store.dimension
+        bounds = np.linspace(0, store.row_count, self.n_shards + 1).astype(np.int64)
+        self.offsets = bounds[:-1]
+        self._pool = None
+        self._blocks = []
+        atexit.register(self.close)
+        self.shards = []  # (block name, shape, first row)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            shape = (int(end - start), store.dimension)
+            block = SharedMemory(create=True, size=max(1, shape[0] * shape[1] * 4))
+            view = np.ndarray(shape, dtype=np.float32, buffer=block.buf)
+            for chunk in range(0, shape[0], COPY_CHUNK_ROWS):
+                view[chunk : chunk + COPY_CHUNK_ROWS] = store.vectors[
+                    start + chunk : min(start + chunk + COPY_CHUNK_ROWS, end)
+                ]
+            self._blocks.append(block)
+            self.shards.append((block.name, shape, int(start)))
+
+        # "spawn" so workers never inherit the Streamlit server's threads.
+        saved = {name: os.environ.get(name) for name in _BLAS_THREAD_VARIABLES}
+        os.environ.update({name: "1" for name in _BLAS_THREAD_VARIABLES})
+        try:
+            self._pool = get_context("spawn").Pool(self.n_shards)
+            # Start every worker now, while the environment is set.
+            self._pool.map(_ping, range(self.n_shards))
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    @property
+    def nbytes(self) -> int:
+        return self.row_count * self.dimension * 4
+
+    def search(
+        self, query_embeddings: np.ndarray, top_n: int = 5, rows: np.ndarray = None
+    ):
+        """
+        Same contract as VectorStore.search: scores queries against every row,
+        or only `rows` (sorted), and returns (indices, scores) of shape
+        (Q, min(top_n, rows scanned)), best first.
+        """
+        queries = normalize_rows(np.atleast_2d(query_embeddings))
+        pending = []
+        for name, shape, start in self.shards:
+            local_rows = None
+            if rows is not None:
+                lo, hi = np.searchsorted(rows, [start, start + shape[0]])
+                if lo == hi:
+                    continue
+                local_rows = rows[lo:hi] - start
+            pending.append(
+                self._pool.apply_async(
+                    _search_shard, (name, shape, start, queries, top_n, local_rows)
+                )
+            )
+        if not pending:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        parts = [result.get() for result in pending]
+        indices = np.concatenate([part[0] for part in parts], axis=1)
+        scores = np.concatenate([part[1] for part in parts], axis=1)
+        best = top_k_indices(scores, top_n)
+        return (
+            np.take_along_axis(indices, best, axis=-1),
+            np.take_along_axis(scores, best, axis=-1),
+        )
+
+    def close(self):
+        """Stops the workers and frees the shared memory. Safe to call twice."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+def benchmark(
+    store: VectorStore,
+    shard_counts: list,
+    batch: int = 32,
+    n_batches: int = 10,
+    top_n: int = 5,
+    seed: int = 0,
+) -> list:
+    """
+    Throughput of exact batch search, single process versus each shard count.
+
+    Returns:
+        One dict per configuration: queries per second and speed-up over the
+        single-process scan; `matches` checks the results are identical.
+    """
+    rng = np.random.default_rng(seed)
+    batches = [
+        rng.standard_normal((batch, store.dimension)).astype(np.float32)
+        for _ in range(n_batches)
+    ]
+
+    start = time.perf_counter()
+    expected = [store.search(queries, top_n)[0] for queries in batches]
+    baseline_qps = batch * n_batches / (time.perf_counter() - start)
+    report = [{"shards": 0, "qps": baseline_qps, "speedup": 1.0, "matches": True}]
+    for n_shards in shard_counts:
+        sharded = ShardedSearch(store, n_shards)
+        try:
+            sharded.search(batches[0], top_n)  # Workers attach to their blocks.
+            start = time.perf_counter()
+            found = [sharded.search(queries, top_n)[0] for queries in batches]
+            qps = batch * n_batches / (time.perf_counter() - start)
+        finally:
+            sharded.close()
+        report.append(
+            {
+                "shards": sharded.n_shards,
+                "qps": qps,
+                "speedup": qps / baseline_qps,
+                "matches": all(
+                    np.array_equal(np.sort(a, axis=1), np.sort(b, axis=1))
+                    for a, b in zip(expected, found)
+                ),
+            }
+        )
+    return report
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if command != "bench":
+        print(f"Unknown command '{command}'. Use 'bench'.")
+        sys.exit(1)
+    n_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    dimension = int(sys.argv[3]) if len(sys.argv) > 3 else 768
+    rng = np.random.default_rng(0)
+    vectors = np.empty((n_rows, dimension), dtype=np.float32)
+    for start in range(0, n_rows, COPY_CHUNK_ROWS):
+        vectors[start : start + COPY_CHUNK_ROWS] = normalize_rows(
+            rng.standard_normal((min(COPY_CHUNK_ROWS, n_rows - start), dimension))
+        )
+    store = VectorStore(vectors, {"row_count": n_rows, "dimension": dimension})
+    cores = os.cpu_count() or 1
+    shard_counts = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1))) or [1]
+    print(f"Exact batch search, {n_rows:,} x {dimension}, {cores} cores:")
+    for row in benchmark(store, shard_counts):
+        label = "1 process" if row["shards"] == 0 else f"{row['shards']} shards"
+        print(
+            f"  {label:>10}  {row['qps']:9.1f} queries/s  "
+            f"x{row['speedup']:.2f}  {'✅' if row['matches'] else '❌ results differ'}"
+        )
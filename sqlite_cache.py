@@ -0,0 +1,88 @@
+"""
+Shared plumbing for the small SQLite-backed LRU caches (embeddings, strategy
+responses, extracted documents).
+
+Each cache is one table in its own WAL-mode SQLite file, with a `last_used`
+column that reads refresh. Writes evict the least recently used rows once the
+table holds more than `max_entries`.
+"""
+
+import sqlite3
+import threading
+
+
+class SQLiteLRUCache:
+    """
+    Base class: a SQLite table capped at `max_entries` rows. Thread-safe.
+
+    Subclasses set TABLE and COLUMNS (which must include `last_used REAL`),
+    read and write under `self._lock`, count `hits` and `misses`, and call
+    `_evict()` inside their write transaction.
+    """
+
+    TABLE = None
+    COLUMNS = None
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.TABLE} ({self.COLUMNS})"
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_last_used ON {self.TABLE} (last_used)"
+            )
+
+    def _count(self) -> int:
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()
+        return count
+
+    def _evict(self) -> None:
+        """Deletes the least recently used rows over the cap."""
+        count = self._count()
+        if count > self.max_entries:
+            self._conn.execute(
+                f"DELETE FROM {self.TABLE} WHERE rowid IN ("
+                f"SELECT rowid FROM {self.TABLE} ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": self._count(),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class LazyDefault:
+    """A process-wide instance, built by `factory` on first use and replaceable."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._value is None:
+                self._value = self._factory()
+            return self._value
+
+    def set(self, value) -> None:
+        with self._lock:
+            self._value = value
@@ -0,0 +1,289 @@
+"""
+Incremental parsing of the JSON array of arguments returned by the strategy model.
+
+The model is asked for a single JSON array of flat objects. With a streaming
+response, text arrives in arbitrary chunks; `IncrementalArrayParser` scans it
+once, tracking string and nesting state, and hands back each top-level object as
+soon as its closing brace arrives.
+
+`SchemaArrayParser` builds on it to salvage a damaged response: every object
+that parses (after a light repair) and matches the response schema is kept,
+and everything else is skipped and reported rather than failing the whole
+array. The schemas are also sent to Gemini as its response schema.
+"""
+
+import json
+import re
+
+# Free-text fields where a bare "true"/"false" means a boolean: factual_check is
+# true or a correction, but the response schema can only declare it a string.
+BOOLEAN_TEXT_FIELDS = ("factual_check",)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_EXCERPT_CHARS = 80
+
+
+def _excerpt(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= _EXCERPT_CHARS else text[:_EXCERPT_CHARS] + "..."
+
+
+def _repair(raw: str):
+    """Parses an object after fixing trailing commas; None if still invalid."""
+    try:
+        return json.loads(_TRAILING_COMMA.sub(r"\1", raw))
+    except json.JSONDecodeError:
+        return None
+
+
+class IncrementalArrayParser:
+    """Feeds text chunks in and returns the complete top-level array objects."""
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+        # Raw text of objects that closed but were not valid JSON, even repaired.
+        self.dropped = []
+
+    def feed(self, chunk: str) -> list:
+        """Consumes a chunk of model output; returns objects completed by it."""
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+        for pos in range(self._pos, len(buffer)):
+            char = buffer[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif not self._in_array:
+                # Before the array: only a "[" outside any string or object
+                # opens it, so a bare object with a "[" in it is left whole.
+                if char == "{":
+                    self._depth += 1
+                elif char == "}":
+                    self._depth = max(0, self._depth - 1)
+                elif char == "[" and self._depth == 0:
+                    self._in_array = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._object_start = pos
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    continue  # The array's own closing bracket.
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = buffer[self._object_start : pos + 1]
+                    try:
+                        parsed = json.loads(raw)
+                    except json.JSONDecodeError:
+                        parsed = _repair(raw)
+                    if isinstance(parsed, dict):
+                        completed.append(parsed)
+                    else:
+                        self.dropped.append(raw)
+                    self._object_start = None
+        self._pos = len(buffer)
+        # Keep only the unfinished object (if any) to bound memory.
+        if self._object_start is None:
+            self._buffer, self._pos = "", 0
+        else:
+            self._buffer = buffer[self._object_start :]
+            self._pos -= self._object_start
+            self._object_start = 0
+        return completed
+
+    @property
+    def started(self) -> bool:
+        """Whether the opening bracket of the array has been seen."""
+        return self._in_array
+
+    @property
+    def pending(self) -> str:
+        """Text of the object still being received, if any."""
+        return self._buffer if self._object_start is not None else ""
+
+
+# ==============================================================================
+# SCHEMAS AND SALVAGE PARSING
+# ==============================================================================
+
+STRATEGY_CATEGORIES = ("Jurisdiction", "Admissibility", "Merits")
+
+# Response schema for Gemini's controlled generation (an OpenAPI schema subset).
+# Sent with response_mime_type="application/json", and also what
+# validate_item checks each parsed argument against.
+STRATEGY_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "argument": {"type": "string"},
+            "category": {"type": "string", "enum": list(STRATEGY_CATEGORIES)},
+            "factual_check": {"type": "string"},
+            "source_text": {"type": "string"},
+            "is_new_argument": {"type": "boolean"},
+        },
+        "required": ["title", "argument", "category", "factual_check"],
+    },
+}
+
+
+def validate_item(item: dict, schema: dict) -> tuple:
+    """
+    Checks one object against an items schema of flat fields.
+
+    Required fields must be present and non-empty. String fields also accept
+    other scalars, as-is, and in BOOLEAN_TEXT_FIELDS a "true"/"false" string
+    becomes True/False. Booleans also accept "true"/"false", enums match
+    case-insensitively and are returned in their canonical spelling, and a
+    string is accepted for an array of strings. Unknown fields are kept.
+
+    Returns:
+        (cleaned copy of the item, None), or (None, why it was rejected).
+    """
+    cleaned = dict(item)
+    for name, spec in schema["properties"].items():
+        value = cleaned.get(name)
+        if value is None or value == "":
+            if name in schema.get("required", ()):
+                return None, f"missing '{name}'"
+            cleaned.pop(name, None)
+            continue
+        kind = spec["type"]
+        if kind == "string":
+            if isinstance(value, (list, dict)):
+                return None, f"'{name}' is not a string"
+            if (
+                name in BOOLEAN_TEXT_FIELDS
+                and isinstance(value, str)
+                and value.strip().lower() in ("true", "false")
+            ):
+                value = value.strip().lower() == "true"
+            if "enum" in spec:
+                matches = [
+                    option
+                    for option in spec["enum"]
+                    if option.lower() == str(value).strip().lower()
+                ]
+                if not matches:
+                    return None, (
+                        f"'{name}' is '{value}', not one of {', '.join(spec['enum'])}"
+                    )
+                value = matches[0]
+        elif kind == "boolean":
+            if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+                value = value.strip().lower() == "true"
+            elif not isinstance(value, bool):
+                return None, f"'{name}' is not a boolean"
+        elif kind == "array":
+            if isinstance(value, str):
+                value = [value]
+            elif not isinstance(value, list):
+                return None, f"'{name}' is not a list"
+        cleaned[name] = value
+    return cleaned, None
+
+
+class SchemaArrayParser:
+    """
+    IncrementalArrayParser that also validates each object against an array
+    schema and salvages what it can, instead of failing the whole response.
+
+    Objects that are not valid JSON are retried with trailing commas removed;
+    objects that still fail, fail validation, or are cut off at the end of
+    the response are skipped and described in `dropped`.
+    """
+
+    def __init__(self, schema: dict):
+        self.item_schema = schema["items"]
+        self._parser = IncrementalArrayParser()
+        self._text = []
+        self.dropped = []
+
+    @property
+    def started(self) -> bool:
+        return self._parser.started
+
+    def feed(self, chunk: str) -> list:
+        """Consumes a chunk of model output; returns the valid objects completed by it."""
+        self._text.append(chunk)
+        parsed = self._parser.feed(chunk)
+        self.dropped.extend(
+            f"invalid JSON: {_excerpt(raw)}" for raw in self._parser.dropped
+        )
+        self._parser.dropped.clear()
+        return self._validate(parsed)
+
+    def finish(self) -> list:
+        """
+        Call once the response is complete. Records a truncated final object,
+        and if no array was found at all, accepts a bare top-level object, or
+        the objects of an array wrapped in one (e.g. {"arguments": [...]}).
+        Returns any valid objects recovered this way.
+        """
+        if self._parser.pending.strip():
+            self.dropped.append(f"truncated: {_excerpt(self._parser.pending)}")
+        if self.started:
+            return []
+        text = "".join(self._text).strip()
+        text = text.removeprefix("```json").removeprefix("```").removesuffix("```")
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            value = _repair(text)
+        if isinstance(value, dict):
+            lists = [v for v in value.values() if isinstance(v, list)]
+            if len(lists) == 1 and all(isinstance(v, dict) for v in lists[0]):
+                return self._validate(lists[0])
+            return self._validate([value])
+        if text:
+            self.dropped.append(f"no JSON array in response: {_excerpt(text)}")
+        return []
+
+    def _validate(self, items: list) -> list:
+        valid = []
+        for item in items:
+            cleaned, problem = validate_item(item, self.item_schema)
+            if problem is None:
+                valid.append(cleaned)
+            else:
+                title = item.get("title") or item.get("argument_summary") or ""
+                self.dropped.append(
+                    f"{problem}: {_excerpt(str(title))}" if title else problem
+                )
+        return valid
+
+
+def parse_array(text: str, schema: dict) -> tuple:
+    """
+    Salvages every valid object from a complete, possibly damaged, JSON array
+    response.
+
+    Returns:
+        (list of valid objects, list of descriptions of what was dropped).
+
+    A bare object is accepted, even with a "[" inside one of its strings:
+
+    >>> parse_array(
+    ...     '{"title": "a [draft]", "argument": "b", "category": "Merits", '
+    ...     '"factual_check": "true"}',
+    ...     STRATEGY_RESPONSE_SCHEMA,
+    ... )
+    ([{'title': 'a [draft]', 'argument': 'b', 'category': 'Merits', 'factual_check': True}], [])
+    """
+    parser = SchemaArrayParser(schema)
+    items = parser.feed(text)
+    items.extend(parser.finish())
+    return items, parser.dropped
@@ -0,0 +1,186 @@
+"""
+Lightweight per-request tracing: nested timing spans, counters and payload sizes.
+
+A trace is active only inside `with trace(...)`, and only for the thread (or
+context) that opened it. Everywhere else `span()` returns a shared no-op and
+`count()` returns immediately, so instrumented code costs one ContextVar
+lookup per call when tracing is off.
+
+    with trace("dashboard_run") as t:
+        with span("llm", prompt_chars=1234) as s:
+            ...
+            s.set(response_chars=len(text))
+        count("embedding_calls", 3)
+    t.append_jsonl()
+
+Work done on other threads (e.g. a shared search batch) can be traced there
+and its spans copied into the caller's trace with `graft()`.
+"""
+
+import contextvars
+import json
+import time
+from contextlib import contextmanager
+
+TRACE_FILE = "traces.jsonl"
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed stage. Attributes hold sizes, counts and flags."""
+
+    __slots__ = ("trace", "name", "attrs", "depth", "start", "duration")
+
+    def __init__(self, trace, name: str, attrs: dict):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.depth = 0
+        self.start = None
+        self.duration = None
+
+    def __enter__(self):
+        self.depth = len(self.trace._stack)
+        self.trace._stack.append(self)
+        self.trace.spans.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace._stack.pop()
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class Trace:
+    """The spans (in start order) and counters recorded for one request."""
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.counters = {}
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self._stack = []
+
+    def span(self, name: str, **attrs) -> Span:
+        return Span(self, name, attrs)
+
+    def record(self, name: str, start: float, end: float, **attrs):
+        """Adds an already finished span (perf_counter times) at the current depth."""
+        span = Span(self, name, attrs)
+        span.depth = len(self._stack)
+        span.start, span.duration = start, end - start
+        self.spans.append(span)
+
+    def graft(self, spans: list):
+        """Copies finished spans from another trace under the current span."""
+        base = len(self._stack)
+        for other in spans:
+            span = Span(self, other.name, dict(other.attrs))
+            span.depth = base + other.depth
+            span.start, span.duration = other.start, other.duration
+            self.spans.append(span)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def rows(self) -> list:
+        """One dict per span: name indented by depth, offset and duration in ms."""
+        return [
+            {
+                "span": "  " * span.depth + span.name,
+                "start_ms": round((span.start - self.start) * 1000, 2),
+                "duration_ms": (
+                    None if span.duration is None else round(span.duration * 1000, 2)
+                ),
+                **span.attrs,
+            }
+            for span in self.spans
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": (
+                None if self.duration is None else round(self.duration * 1000, 2)
+            ),
+            "attrs": self.attrs,
+            "counters": self.counters,
+            "spans": [
+                {
+                    "name": span.name,
+                    "depth": span.depth,
+                    "start_ms": round((span.start - self.start) * 1000, 3),
+                    "duration_ms": (
+                        None
+                        if span.duration is None
+                        else round(span.duration * 1000, 3)
+                    ),
+                    "attrs": span.attrs,
+                }
+                for span in self.spans
+            ],
+        }
+
+    def append_jsonl(self, path: str = TRACE_FILE):
+        """Appends this trace as one JSON line."""
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.to_dict(), default=str) + "\n")
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """Records a trace for everything run in this context until the block exits."""
+    current = Trace(name, **attrs)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current.reset(token)
+
+
+def current_trace():
+    """The active Trace, or None when tracing is off."""
+    return _current.get()
+
+
+def span(name: str, **attrs):
+    """A timing span in the active trace; a no-op when tracing is off."""
+    current = _current.get()
+    if current is None:
+        return _NULL_SPAN
+    return current.span(name, **attrs)
+
+
+def count(name: str, n: int = 1):
+    """Adds to a counter of the active trace, if any."""
+    current = _current.get()
+    if current is not None:
+        current.count(name, n)
@@ -0,0 +1,269 @@
+"""
+Pre-normalized float32 vector store for the argument embeddings.
+
+The store is written once at index time (L2-normalized, float32) together with a
+manifest describing what it was built from. At query time it is opened with
+mmap_mode="r", so every Streamlit worker shares the same OS pages, and cosine
+similarity reduces to a plain dot product.
+
+Build it from an existing embeddings file with:
+    python vector_store.py arguments_embeddings.npy
+"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+
+import numpy as np
+
+DATABASE_FILE = "legal_arguments_database_merged.csv"
+STORE_FILE = "arguments_embeddings.f32.npy"
+MANIFEST_FILE = "arguments_embeddings.manifest.json"
+MODEL_NAME_EMBED = "gemini-embedding-001"
+MANIFEST_VERSION = 1
+
+
+class StaleIndexError(Exception):
+    """Raised when the vector store does not match the database or embedding model."""
+
+
+def file_sha256(path: str) -> str:
+    """Returns the hex SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalizes each row as float32. All-zero rows are left as zeros."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the indices of the k highest scores along the last axis, best first.
+    Uses argpartition so only the k selected entries are sorted.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+def build_vector_store(
+    embeddings: np.ndarray,
+    database_file: str = DATABASE_FILE,
+    model_name: str = MODEL_NAME_EMBED,
+    store_file: str = STORE_FILE,
+    manifest_file: str = MANIFEST_FILE,
+    expected_rows: int = None,
+) -> dict:
+    """
+    Writes normalized float32 vectors and their manifest. Row i of `embeddings`
+    must correspond to row i of `database_file`; pass `expected_rows` (the number
+    of database rows) to refuse writing a misaligned store.
+
+    Returns:
+        The manifest that was written.
+    """
+    vectors = normalize_rows(embeddings)
+    if vectors.ndim != 2:
+        raise ValueError(
+            f"Expected a 2-D embeddings matrix, got shape {vectors.shape}."
+        )
+    if expected_rows is not None and vectors.shape[0] != expected_rows:
+        raise ValueError(
+            f"Got {vectors.shape[0]} embeddings for {expected_rows} database rows."
+        )
+    # Write to a temporary file and swap it in, so processes that still have the
+    # old file memory-mapped keep reading valid data.
+    tmp_file = store_file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        np.save(f, vectors)
+    os.replace(tmp_file, store_file)
+    return write_manifest(vectors.shape, database_file, model_name, manifest_file)
+
+
+def write_manifest(
+    shape: tuple,
+    database_file: str = DATABASE_FILE,
+    model_name: str = MODEL_NAME_EMBED,
+    manifest_file: str = MANIFEST_FILE,
+) -> dict:
+    """Writes the manifest for a store of the given (rows, dimension) shape."""
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "model_name": model_name,
+        "dimension": int(shape[1]),
+        "row_count": int(shape[0]),
+        "database_file": os.path.basename(database_file),
+        "database_sha256": file_sha256(database_file),
+        "normalized": True,
+        "dtype": "float32",
+    }
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+
+def append_to_vector_store(
+    new_embeddings: np.ndarray,
+    database_file: str = DATABASE_FILE,
+    model_name: str = MODEL_NAME_EMBED,
+    store_file: str = STORE_FILE,
+    manifest_file: str = MANIFEST_FILE,
+) -> dict:
+    """
+    Appends normalized rows to an existing store file without rewriting the rows
+    already on disk, then refreshes the manifest for `database_file`.
+
+    The .npy header is rewritten in place with the new row count; if it would no
+    longer fit in the original header's padding, the whole file is rewritten.
+
+    Returns:
+        The manifest that was written.
+    """
+    new_vectors = normalize_rows(new_embeddings)
+    with open(store_file, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version != (1, 0):
+            raise ValueError(f"Unsupported .npy version {version} in '{store_file}'.")
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        data_offset = f.tell()
+        if fortran_order or dtype != np.float32 or len(shape) != 2:
+            raise ValueError(f"'{store_file}' is not a C-ordered float32 matrix.")
+        if new_vectors.ndim != 2 or new_vectors.shape[1] != shape[1]:
+            raise ValueError(
+                f"Cannot append vectors of shape {new_vectors.shape} to {shape}."
+            )
+        new_shape = (shape[0] + len(new_vectors), shape[1])
+
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(
+            header, {"descr": dtype.str, "fortran_order": False, "shape": new_shape}
+        )
+        if len(header.getvalue()) == data_offset:
+            f.seek(0, os.SEEK_END)
+            f.write(new_vectors.tobytes())
+            f.seek(0)
+            f.write(header.getvalue())
+            return write_manifest(new_shape, database_file, model_name, manifest_file)
+
+    existing = np.load(store_file, mmap_mode="r")
+    combined = np.concatenate([existing, new_vectors])
+    del existing
+    return build_vector_store(
+        combined, database_file, model_name, store_file, manifest_file
+    )
+
+
+class VectorStore:
+    """Memory-mapped, normalized embedding matrix with dot-product top-k search."""
+
+    def __init__(self, vectors: np.ndarray, manifest: dict):
+        self.vectors = vectors
+        self.manifest = manifest
+
+    @property
+    def row_count(self) -> int:
+        return self.vectors.shape[0]
+
+    @property
+    def dimension(self) -> int:
+        return self.vectors.shape[1]
+
+    @classmethod
+    def open(
+        cls,
+        database_file: str = DATABASE_FILE,
+        model_name: str = MODEL_NAME_EMBED,
+        store_file: str = STORE_FILE,
+        manifest_file: str = MANIFEST_FILE,
+        expected_rows: int = None,
+    ) -> "VectorStore":
+        """
+        Opens the store read-only via mmap and validates it against its manifest
+        and, if given, the number of rows in the loaded database.
+
+        Raises:
+            FileNotFoundError: If the store or manifest has not been built.
+            StaleIndexError: If the store was built for another model or database.
+        """
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        vectors = np.load(store_file, mmap_mode="r")
+
+        problems = []
+        if manifest.get("model_name") != model_name:
+            problems.append(
+                f"built with model '{manifest.get('model_name')}', expected '{model_name}'"
+            )
+        if vectors.ndim != 2 or vectors.shape != (
+            manifest.get("row_count"),
+            manifest.get("dimension"),
+        ):
+            problems.append(
+                f"vector shape {vectors.shape} does not match manifest "
+                f"({manifest.get('row_count')}, {manifest.get('dimension')})"
+            )
+        if expected_rows is not None and manifest.get("row_count") != expected_rows:
+            problems.append(
+                f"{manifest.get('row_count')} vectors for {expected_rows} database rows"
+            )
+        if vectors.dtype != np.float32:
+            problems.append(f"vectors are {vectors.dtype}, expected float32")
+        if manifest.get("database_sha256") != file_sha256(database_file):
+            problems.append(f"'{database_file}' has changed since the store was built")
+        if problems:
+            raise StaleIndexError(
+                f"Vector store '{store_file}' is stale: "
+                + "; ".join(problems)
+                + ". Re-run the indexing step."
+            )
+        return cls(vectors, manifest)
+
+    def search(
+        self, query_embeddings: np.ndarray, top_n: int = 5, rows: np.ndarray = None
+    ):
+        """
+        Scores queries against every stored vector, or only against `rows`.
+
+        Args:
+            query_embeddings: A (Q, D) or (D,) array of raw query embeddings.
+            top_n: Number of results per query.
+            rows: Optional sorted row indices to restrict the scan to (e.g. a
+                resolved metadata filter); only these vectors are read.
+
+        Returns:
+            (indices, scores), each of shape (Q, min(top_n, rows scanned)), best
+            match first. Indices are always rows of the full store.
+        """
+        queries = normalize_rows(np.atleast_2d(query_embeddings))
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        similarities = queries @ vectors.T
+        indices = top_k_indices(similarities, top_n)
+        scores = np.take_along_axis(similarities, indices, axis=-1)
+        return (indices if rows is None else rows[indices]), scores
+
+
+if __name__ == "__main__":
+    source_file = sys.argv[1] if len(sys.argv) > 1 else "arguments_embeddings.npy"
+    manifest = build_vector_store(np.load(source_file))
+    print(
+        f"✅ Wrote {manifest['row_count']} x {manifest['dimension']} vectors to "
+        f"'{STORE_FILE}' with manifest '{MANIFEST_FILE}'."
+    )
@@ -1,92 +1,38 @@
-import streamlit as st
-import vertexai
-from vertexai.generative_models import (
-    GenerativeModel,
-    GenerationConfig,
-    HarmCategory,
-    HarmBlockThreshold,
-)
-from vertexai.language_models import TextEmbeddingModel
 import json
-import pandas as pd
 import numpy as np
-import os
-from sklearn.metrics.pairwise import cosine_similarity
-import warnings
-
-# --- Suppress a known, harmless warning from the Google Cloud client ---
-warnings.filterwarnings(
-    "ignore",
-    category=UserWarning,
-    module="google.cloud.aiplatform.compat.services.prediction_service_client",
-)
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
 
-# --- DIRECT CONFIGURATION & INITIALIZATION ---
-PROJECT_ID = "hack-thelaw25cam-586"
-LOCATION = "us-central1"
+import resources
+import tracing
+from resources import (
+    ResourceUnavailable,
+    MODEL_NAME_EMBED,
+    GENERATION_SETTINGS,
+)
+from vector_store import normalize_rows
+from ann_index import DEFAULT_NPROBE
+from embedding_cache import get_default_cache
+from bm25 import reciprocal_rank_fusion
+from diversity import mmr_select, DEFAULT_MMR_LAMBDA
+from response_cache import get_default_response_cache, response_key
+from result_types import PrecedentResults, StrategyAnalysis
+from strategy_parsing import STRATEGY_RESPONSE_SCHEMA, SchemaArrayParser, parse_array
 
-if "gcp_initialized" not in st.session_state:
-    try:
-        vertexai.init(project=PROJECT_ID, location=LOCATION)
-        st.session_state.gcp_initialized = True
-        print(f"✅ Vertex AI Initialized directly with Project ID: {PROJECT_ID}")
-    except Exception as e:
-        st.session_state.gcp_initialized = False
-        st.error(f"""
-        🔴 **Failed to initialize Google Cloud AI.**
-        This usually means you are not authenticated.
-        
-        **Please run the following command in your terminal and then restart the app:**
-        ```
-        gcloud auth application-default login
-        ```
-        *Original Error: {e}*
-        """)
+# Models, the database and the indexes are process-wide singletons built on first
+# use (see resources.py); start loading them now, in the background.
+resources.start_warm_up()
 
 # ==============================================================================
 # SCRIPT 1: ADVANCED STRATEGY ANALYSIS
 # ==============================================================================
 
-if st.session_state.get("gcp_initialized", False):
-    generation_config = GenerationConfig(
-        temperature=0.4,
-        top_p=0.95,
-        top_k=40,
-        max_output_tokens=8192,
-    )
-    safety_settings = {
-        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-    }
-    # Using the exact model name you specified.
-    MODEL_NAME_GEN = "gemini-2.0-flash-lite-001"
-    try:
-        reasoning_model = GenerativeModel(
-            MODEL_NAME_GEN,
-            generation_config=generation_config,
-            safety_settings=safety_settings,
-        )
-    except Exception as e:
-        st.error(
-            f"Could not initialize Generative Model '{MODEL_NAME_GEN}'. It may not be available in your project. Error: {e}"
-        )
-        st.session_state.gcp_initialized = False
-
-
-@st.cache_data
-def analyze_arbitration_strategy(strategy_text: str, factual_text: str) -> str:
-    if not st.session_state.get("gcp_initialized", False):
-        return json.dumps(
-            {"error": "GCP not initialized. Cannot perform analysis."}, indent=4
-        )
-    if not strategy_text and not factual_text:
-        return json.dumps(
-            {"error": "Both strategy and factual text are empty."}, indent=4
-        )
-
-    factual_text = """Fenoscadia Limited (“Fenoscadia”) is a privately owned mining company incorporated in the Republic of Ticadia. In 2008, the Republic of Kronos, a neighboring state, granted Fenoscadia an exclusive 80-year license to extract lindoro, a rare earth metal, from its territory. The concession agreement permitted Fenoscadia to mine lindoro in Kronos’s inland regions, and the company began commercial operations shortly thereafter. Lindoro is a valuable resource used in electronics and renewable energy technologies, and Fenoscadia became the sole extractor of lindoro in Kronos.
+# Factual background of the demo case.
+DEFAULT_FACTUAL_BACKGROUND = """Fenoscadia Limited (“Fenoscadia”) is a privately owned mining company incorporated in the Republic of Ticadia. In 2008, the Republic of Kronos, a neighboring state, granted Fenoscadia an exclusive 80-year license to extract lindoro, a rare earth metal, from its territory. The concession agreement permitted Fenoscadia to mine lindoro in Kronos’s inland regions, and the company began commercial operations shortly thereafter. Lindoro is a valuable resource used in electronics and renewable energy technologies, and Fenoscadia became the sole extractor of lindoro in Kronos.
 
 Over the years, Fenoscadia invested significantly in infrastructure, technology, and labor to support its operations, and the project became a key part of Kronos’s export economy. However, tensions emerged in 2016 when the government of Kronos issued Presidential Decree No. 242, revoking Fenoscadia’s mining license and unilaterally terminating the concession. The decree cited environmental and public health concerns, referencing a government-funded scientific study that allegedly linked lindoro mining to contamination of the Rhea River and increased rates of cardiovascular disease and microcephaly among local populations.
 
@@ -94,6 +40,11 @@ The study, however, did not conclusively establish a direct causal link between
 
 Arbitration proceedings were subsequently initiated by Fenoscadia against Kronos. In response, Kronos filed a counterclaim, seeking at least USD 150 million in damages for alleged environmental degradation, public health costs, and the expense of purifying contaminated water sources. Fenoscadia disputes both the jurisdiction of the tribunal over the counterclaim and its substantive validity, arguing that its operations were conducted in compliance with Kronos’s environmental regulations and that the study lacks sufficient scientific basis to support the claimed damages."""
 
+
+def _build_strategy_prompt(strategy_text: str, factual_text: str) -> list:
+    # Without uploaded documents, analyze against the demo case.
+    factual_text = factual_text or DEFAULT_FACTUAL_BACKGROUND
+
     # --- FULL PROMPT AS PROVIDED ---
     prompt = [
         "You are an expert legal counsel in international investment arbitration. You will be given two pieces of text: a 'CASE STRATEGY' and a 'FACTUAL BACKGROUND'.",
@@ -135,85 +86,667 @@ Arbitration proceedings were subsequently initiated by Fenoscadia against Kronos
         "--- FACTUAL BACKGROUND ---",
         factual_text,
     ]
+    return prompt
+
 
+# Parsed analyses are cached on disk, keyed on the rendered prompt, model name and
+# generation settings (see response_cache.py), so repeated strategies cost no
+# tokens. Pass use_cache=False to force a fresh model call.
+STRATEGY_CACHE_ENABLED = True
+
+
+def _strategy_cache_key(prompt: list) -> str:
+    return response_key(resources.generation_model_name(), GENERATION_SETTINGS, prompt)
+
+
+def analyze_arbitration_strategy(
+    strategy_text: str, factual_text: str, use_cache: bool = True
+) -> StrategyAnalysis:
+    if not strategy_text and not factual_text:
+        return StrategyAnalysis(error="Both strategy and factual text are empty.")
+    prompt = _build_strategy_prompt(strategy_text, factual_text)
+    use_cache = use_cache and STRATEGY_CACHE_ENABLED
+    if use_cache:
+        with tracing.span("strategy.response_cache") as cache_span:
+            cached = get_default_response_cache().get(_strategy_cache_key(prompt))
+            cache_span.set(hit=cached is not None)
+        if cached is not None:
+            return StrategyAnalysis(arguments=cached)
     try:
-        response = reasoning_model.generate_content(prompt)
-        text_response = response.text
-        start, end = text_response.find("["), text_response.rfind("]")
-        if start != -1 and end != -1:
-            json_str = text_response[start : end + 1]
-            parsed_json = json.loads(json_str)
-            return json.dumps(parsed_json, indent=4)
-        return json.dumps(
-            {
-                "error": "No valid JSON array found in model's response.",
-                "raw_response": text_response,
-            },
-            indent=4,
+        reasoning_model = resources.reasoning_model()
+    except ResourceUnavailable as e:
+        return StrategyAnalysis(error=str(e))
+
+    try:
+        with tracing.span(
+            "strategy.llm", prompt_chars=sum(len(part) for part in prompt)
+        ) as llm_span:
+            response = reasoning_model.generate_content(prompt)
+            text_response = response.text
+            llm_span.set(response_chars=len(text_response))
+        tracing.count("llm_calls")
+        # Keep every valid argument even if others in the array are damaged.
+        arguments, dropped = parse_array(text_response, STRATEGY_RESPONSE_SCHEMA)
+        if arguments:
+            # Only complete responses are cached; a damaged one is retried next time.
+            if use_cache and not dropped:
+                get_default_response_cache().put(_strategy_cache_key(prompt), arguments)
+            return StrategyAnalysis(arguments=arguments, dropped=dropped)
+        return StrategyAnalysis(
+            error="No valid JSON array found in model's response.",
+            raw_response=text_response,
+            dropped=dropped,
         )
     except Exception as e:
-        return json.dumps(
-            {
-                "error": f"An unexpected error occurred during strategy analysis: {str(e)}"
-            },
-            indent=4,
+        return StrategyAnalysis(
+            error=f"An unexpected error occurred during strategy analysis: {str(e)}"
+        )
+
+
+def analyze_arbitration_strategy_as_json(
+    strategy_text: str, factual_text: str, use_cache: bool = True
+) -> str:
+    """JSON string form of analyze_arbitration_strategy, for external callers."""
+    return analyze_arbitration_strategy(
+        strategy_text, factual_text, use_cache
+    ).to_json()
+
+
+class StrategyStream:
+    """
+    Iterates over argument dicts as the model generates them, using the streaming
+    response. After iteration, `result` holds the full StrategyAnalysis (all
+    arguments, or the error and raw response).
+    """
+
+    def __init__(self, strategy_text: str, factual_text: str, use_cache: bool = True):
+        self.strategy_text = strategy_text
+        self.factual_text = factual_text
+        self.use_cache = use_cache and STRATEGY_CACHE_ENABLED
+        self.result = None
+
+    def __iter__(self):
+        if not self.strategy_text and not self.factual_text:
+            self.result = StrategyAnalysis(
+                error="Both strategy and factual text are empty."
+            )
+            return
+        prompt = _build_strategy_prompt(self.strategy_text, self.factual_text)
+        cache_key = _strategy_cache_key(prompt)
+        if self.use_cache:
+            with tracing.span("strategy.response_cache") as cache_span:
+                cached = get_default_response_cache().get(cache_key)
+                cache_span.set(hit=cached is not None)
+            if cached is not None:
+                self.result = StrategyAnalysis(arguments=cached)
+                yield from (dict(argument) for argument in cached)
+                return
+        try:
+            reasoning_model = resources.reasoning_model()
+        except ResourceUnavailable as e:
+            self.result = StrategyAnalysis(error=str(e))
+            return
+
+        parser = SchemaArrayParser(STRATEGY_RESPONSE_SCHEMA)
+        arguments, raw_chunks = [], []
+        # The caller's work between arguments runs inside this generator, so the
+        # model's time is recorded as one span afterwards rather than nested.
+        started, first_argument = time.perf_counter(), None
+        try:
+            for chunk in reasoning_model.generate_content(prompt, stream=True):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue  # e.g. a final chunk carrying only the finish reason
+                raw_chunks.append(text)
+                for argument in parser.feed(text):
+                    if first_argument is None:
+                        first_argument = time.perf_counter()
+                    # Keep a copy: callers may annotate the yielded dict.
+                    arguments.append(dict(argument))
+                    yield argument
+        except Exception as e:
+            self._record_llm_span(
+                prompt, started, first_argument, raw_chunks, arguments
+            )
+            self.result = StrategyAnalysis(
+                arguments=arguments,
+                error=f"An unexpected error occurred during strategy analysis: {str(e)}",
+                dropped=parser.dropped,
+            )
+            return
+        for argument in parser.finish():
+            arguments.append(dict(argument))
+            yield argument
+        self._record_llm_span(prompt, started, first_argument, raw_chunks, arguments)
+        if arguments:
+            # Only complete responses are cached; a damaged one is retried next time.
+            if self.use_cache and not parser.dropped:
+                get_default_response_cache().put(cache_key, arguments)
+            self.result = StrategyAnalysis(arguments=arguments, dropped=parser.dropped)
+        else:
+            self.result = StrategyAnalysis(
+                error="No valid JSON array found in model's response.",
+                raw_response="".join(raw_chunks),
+                dropped=parser.dropped,
+            )
+
+    @staticmethod
+    def _record_llm_span(prompt, started, first_argument, raw_chunks, arguments):
+        current = tracing.current_trace()
+        if current is None:
+            return
+        current.record(
+            "strategy.llm_stream",
+            started,
+            time.perf_counter(),
+            prompt_chars=sum(len(part) for part in prompt),
+            response_chars=sum(len(text) for text in raw_chunks),
+            chunks=len(raw_chunks),
+            arguments=len(arguments),
+            first_argument_ms=(
+                None
+                if first_argument is None
+                else round((first_argument - started) * 1000, 1)
+            ),
         )
+        current.count("llm_calls")
+
+
+def stream_arbitration_strategy(
+    strategy_text: str, factual_text: str, use_cache: bool = True
+) -> StrategyStream:
+    """Streaming variant of analyze_arbitration_strategy; yields each argument early."""
+    return StrategyStream(strategy_text, factual_text, use_cache)
 
 
 # ==============================================================================
 # SCRIPT 2: SIMILAR ARGUMENT SEARCH
 # ==============================================================================
 
-if st.session_state.get("gcp_initialized", False):
-    DATABASE_FILE, EMBEDDINGS_FILE = (
-        "legal_arguments_database_merged.csv",
-        "arguments_embeddings.npy",
+# "exact" scans every row; "ivf" only scans the IVF_NPROBE nearest clusters of the
+# approximate index built by ann_index.py. Raise IVF_NPROBE for better recall.
+# "int8", "binary" and "truncated" (the leading quantization.TRUNCATED_DIMENSION
+# dimensions) scan the compact copies built by quantization.py and rescore the
+# best QUANTIZED_RESCORE rows exactly with the full vectors. "lexical" is BM25 only;
+# "hybrid" fuses the BM25 and vector (HYBRID_VECTOR_MODE) rankings of the top
+# HYBRID_CANDIDATES rows each with reciprocal rank fusion.
+SEARCH_MODE = "hybrid"
+IVF_NPROBE = DEFAULT_NPROBE
+HYBRID_VECTOR_MODE = "exact"
+HYBRID_CANDIDATES = 50
+QUANTIZED_RESCORE = 200
+
+# Collapse each near-duplicate group (when built) to its best-ranked candidate,
+# and pick the final top-N from MMR_CANDIDATES by maximal marginal relevance, so
+# results are distinct precedents rather than copies of one. Deduplication
+# fetches DEDUPLICATE_OVERFETCH times as many candidates, as some collapse away.
+# MMR_LAMBDA = 1.0 disables MMR.
+DEDUPLICATE = True
+DEDUPLICATE_OVERFETCH = 3
+MMR_CANDIDATES = 25
+MMR_LAMBDA = DEFAULT_MMR_LAMBDA
+
+# Chunks of up to the model's per-request limit are sent concurrently to hide
+# round-trips (gemini-embedding-001 only takes one input per call).
+EMBED_MAX_WORKERS = 8
+
+
+def _embed_uncached(texts: list) -> np.ndarray:
+    """Embeds texts in chunks of the model's batch limit. Returns a (Q, D) array."""
+    from indexer import embed_batch_limit  # pandas, only needed once embedding
+
+    embedding_model = resources.embedding_model()
+    batch_limit = embed_batch_limit(MODEL_NAME_EMBED)
+    chunks = [texts[i : i + batch_limit] for i in range(0, len(texts), batch_limit)]
+    tracing.count("embedding_calls", len(chunks))
+    with tracing.span("embedding_api", texts=len(texts), requests=len(chunks)):
+        with ThreadPoolExecutor(
+            max_workers=min(EMBED_MAX_WORKERS, len(chunks))
+        ) as pool:
+            responses = list(pool.map(embedding_model.get_embeddings, chunks))
+    return np.array(
+        [embedding.values for response in responses for embedding in response]
     )
-    MODEL_NAME_EMBED = "gemini-embedding-001"
+
+
+def embed_texts(texts: list) -> np.ndarray:
+    """
+    Embeds texts through the persistent embedding cache; only texts not seen
+    before (by this or any earlier session) cost a network round-trip.
+    """
+    with tracing.span("embed", texts=len(texts)):
+        return get_default_cache().get_or_embed(
+            resources.embedding_model_name(), texts, _embed_uncached
+        )
+
+
+def _vector_index_or_none():
+    """The vector index, or None when vector search is unavailable (no network)."""
     try:
-        embedding_model = TextEmbeddingModel.from_pretrained(MODEL_NAME_EMBED)
-        db_df = pd.read_csv(DATABASE_FILE)
-        corpus_embeddings = np.load(EMBEDDINGS_FILE)
-    except Exception as e:
-        st.warning(
-            f"Could not load search database or embedding model '{MODEL_NAME_EMBED}'. Search will be disabled. Error: {e}"
+        # Query embeddings need the model; fail early rather than per query.
+        resources.embedding_model()
+        return resources.vector_index()
+    except ResourceUnavailable:
+        return None  # Logged once by resources.py; search falls back to keywords.
+
+
+def _exact_search(index, query_embeddings: np.ndarray, top_n: int, rows=None):
+    """Full scan, across the sharded worker pool when it is enabled."""
+    if resources.SEARCH_SHARDS > 1:
+        try:
+            return resources.sharded_search().search(query_embeddings, top_n, rows)
+        except ResourceUnavailable:
+            pass  # The pool could not start; scan in this process.
+    return index.store.search(query_embeddings, top_n, rows=rows)
+
+
+def _vector_search(
+    index, query_embeddings: np.ndarray, top_n: int, search_mode: str, rows=None
+):
+    """Top-N (indices, scores) per query from the vector store, best first."""
+    store = index.store
+    if search_mode in index.quantized_indexes:
+        return index.quantized_indexes[search_mode].search(
+            store, query_embeddings, top_n, rows=rows, rescore=QUANTIZED_RESCORE
         )
-        st.session_state.gcp_initialized = False
+    if rows is not None:
+        # A filtered subset is scanned exactly; the IVF lists span all rows.
+        return _exact_search(index, query_embeddings, top_n, rows)
+    if search_mode == "ivf" and index.ivf_index is not None:
+        all_indices, all_scores = index.ivf_index.search(
+            store, query_embeddings, top_n, nprobe=IVF_NPROBE
+        )
+        # Probed clusters too small to fill top-N: redo those queries exactly.
+        short = (all_indices < 0).any(axis=1)
+        if short.any():
+            all_indices[short], all_scores[short] = _exact_search(
+                index, query_embeddings[short], top_n
+            )
+        return all_indices, all_scores
+    return _exact_search(index, query_embeddings, top_n)
 
 
-@st.cache_data
-def get_similar_arguments_as_json(query_text: str, top_n: int = 5) -> str:
-    if not st.session_state.get("gcp_initialized", False) or not query_text.strip():
-        return json.dumps(
-            [
-                {
-                    "error": "GCP not initialized or query is empty. Cannot perform search."
-                }
-            ],
-            indent=4,
+def _lexical_results(data, query_texts: list, top_n: int, rows=None) -> list:
+    return [
+        PrecedentResults.from_rows(
+            data.result_columns, *data.bm25_index.search(text, top_n, rows=rows)
         )
+        for text in query_texts
+    ]
+
+
+def _deduplicating(index) -> bool:
+    return DEDUPLICATE and index is not None and index.canonical_index is not None
+
+
+def _collapse_duplicates(index, candidates: np.ndarray) -> np.ndarray:
+    """
+    Positions of the best-ranked candidate of each near-duplicate group, in order.
+    Candidates already passed the metadata filter, so a group is represented
+    by whichever of its members matched, not only by its canonical row.
+    """
+    groups = index.canonical_index.canonical_of[candidates]
+    _, first = np.unique(groups, return_index=True)
+    return np.sort(first)
+
+
+def _select_results(
+    data,
+    index,
+    query_embedding: np.ndarray,
+    candidates: np.ndarray,
+    top_n: int,
+    fused_scores: np.ndarray = None,
+) -> PrecedentResults:
+    """
+    Picks top-N of a best-first candidate pool, deduplicated and diversified by MMR.
+
+    Args:
+        fused_scores: The pool's RRF scores in hybrid mode. MMR then ranks by
+            them (scaled so the best is 1) rather than by cosine similarity,
+            which would discard the keyword half of the fusion.
+    """
+    keep = np.flatnonzero(candidates >= 0)
+    if _deduplicating(index):
+        keep = keep[_collapse_duplicates(index, candidates[keep])]
+    candidates = candidates[keep]
+    candidate_vectors = np.asarray(index.store.vectors[candidates])
+    # Cosine similarity, so reported scores stay comparable across modes.
+    similarity = candidate_vectors @ query_embedding
+    relevance = similarity
+    if fused_scores is not None and len(keep):
+        relevance = fused_scores[keep] / fused_scores[keep].max()
+    if MMR_LAMBDA < 1.0:
+        picked = mmr_select(relevance, candidate_vectors, top_n, MMR_LAMBDA)
+    else:
+        picked = np.arange(min(top_n, len(candidates)))
+    return PrecedentResults.from_rows(
+        data.result_columns, candidates[picked], similarity[picked]
+    )
+
+
+_embedding_failing = False
+
+
+def _log_embedding_failure(error) -> None:
+    """Prints the first of a run of failed query embeddings; None ends the run."""
+    global _embedding_failing
+    if error is not None and not _embedding_failing:
+        print(f"⚠️ Embedding failed, using keyword search until it recovers: {error}")
+    _embedding_failing = error is not None
+
+
+def _search_similar_arguments(
+    query_texts: list, top_n: int, search_mode: str = SEARCH_MODE, filters=None
+) -> list:
+    """Scores all queries against the corpus in one (Q x N) product; top-N per query."""
+    with tracing.span("load_resources"):
+        data = resources.search_data()
+        index = None if search_mode == "lexical" else _vector_index_or_none()
+    with tracing.span("resolve_rows", filtered=bool(filters)) as rows_span:
+        rows = data.facet_index.resolve(filters)
+        rows_span.set(rows=data.row_count if rows is None else len(rows))
+    if rows is not None and not len(rows):
+        return [PrecedentResults.empty() for _ in query_texts]
+    if index is None:
+        with tracing.span("bm25", queries=len(query_texts)):
+            return _lexical_results(data, query_texts, top_n, rows)
     try:
-        query_embedding = np.array(
-            embedding_model.get_embeddings([query_text])[0].values
-        ).reshape(1, -1)
-        similarities = cosine_similarity(query_embedding, corpus_embeddings)[0]
-        top_n_indices = np.argsort(similarities)[::-1][:top_n]
-        results_df = db_df.iloc[top_n_indices].copy()
-        results_df["similarity_score"] = similarities[top_n_indices]
-        results_df = results_df.fillna("N/A")
-        output_list = [
-            {
-                "similarity_score": row["similarity_score"],
-                "case_identifier": row["case_identifier"],
-                "case_title": row["case_title"],
-                "argument_summary": row["argument_summary"],
-                "judgment": row["court_followed"],
-                "judgment_summary": row["tribunal_reasoning"],
-            }
-            for _, row in results_df.iterrows()
+        query_embeddings = embed_texts(query_texts)
+    except Exception as e:
+        if search_mode != "hybrid":
+            raise
+        _log_embedding_failure(e)
+        return _lexical_results(data, query_texts, top_n, rows)
+    _log_embedding_failure(None)
+
+    n_pool = max(top_n, MMR_CANDIDATES) if MMR_LAMBDA < 1.0 else top_n
+    if _deduplicating(index):
+        n_pool *= DEDUPLICATE_OVERFETCH
+    query_embeddings = normalize_rows(query_embeddings)
+    if search_mode != "hybrid":
+        with tracing.span("vector_scan", mode=search_mode, queries=len(query_texts)):
+            pools, _ = _vector_search(
+                index, query_embeddings, n_pool, search_mode, rows
+            )
+        fused_scores = [None] * len(pools)
+    else:
+        n_candidates = max(n_pool, HYBRID_CANDIDATES)
+        with tracing.span(
+            "vector_scan", mode=HYBRID_VECTOR_MODE, queries=len(query_texts)
+        ):
+            vector_rankings, _ = _vector_search(
+                index, query_embeddings, n_candidates, HYBRID_VECTOR_MODE, rows
+            )
+        with tracing.span("bm25_fusion", queries=len(query_texts)):
+            fused = [
+                reciprocal_rank_fusion(
+                    [
+                        vector_ranking[vector_ranking >= 0],
+                        data.bm25_index.search(text, n_candidates, rows=rows)[0],
+                    ],
+                    n_pool,
+                )
+                for text, vector_ranking in zip(query_texts, vector_rankings)
+            ]
+        pools = [pool for pool, _ in fused]
+        fused_scores = [scores for _, scores in fused]
+    with tracing.span("select_results", candidates=n_pool):
+        return [
+            _select_results(data, index, query_embedding, pool, top_n, scores)
+            for query_embedding, pool, scores in zip(
+                query_embeddings, pools, fused_scores
+            )
         ]
-        return json.dumps(output_list, indent=4)
+
+
+# ==============================================================================
+# CROSS-SESSION MICRO-BATCHING
+# ==============================================================================
+
+
+class MicroBatcher:
+    """
+    Coalesces requests from many threads (i.e. Streamlit sessions) into batches.
+
+    `submit` queues an item and returns a Future. A single worker thread takes
+    the first waiting item, keeps collecting until `max_batch_size` items or
+    `max_wait_ms` after that item arrived, then calls `process_batch(items)`
+    once and resolves every future with its result. `process_batch` returns one
+    result per item; an Exception instance as a result fails just that item.
+    Both knobs can be changed at runtime.
+
+    If any item was submitted while a trace was active, the batch is traced on
+    the worker and the batch's Trace is attached to those items' futures as
+    `future.batch_trace`, for the caller to graft.
+    """
+
+    def __init__(
+        self, process_batch, max_batch_size: int = 32, max_wait_ms: float = 10.0
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        # Recent batches only, for the metrics.
+        self._batch_sizes = deque(maxlen=1000)
+        self._queue_delays_ms = deque(maxlen=10_000)
+        self._batch_ms = deque(maxlen=1000)
+        self._requests = 0
+        self._first_submit = None
+        self._last_done = None
+
+    def submit(self, item) -> Future:
+        future = Future()
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="micro-batcher", daemon=True
+                )
+                self._worker.start()
+            if self._first_submit is None:
+                self._first_submit = time.perf_counter()
+        traced = tracing.current_trace() is not None
+        self._queue.put((item, future, time.perf_counter(), traced))
+        return future
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                batch.append(
+                    self._queue.get(timeout=timeout)
+                    if timeout > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            traced = any(entry[3] for entry in batch)
+            with tracing.trace("search_batch") if traced else nullcontext() as trace:
+                with tracing.span("search_batch", batch_size=len(batch)):
+                    try:
+                        results = self.process_batch([entry[0] for entry in batch])
+                    except Exception as e:
+                        results = [e] * len(batch)
+            for (_, future, submitted, item_traced), result in zip(batch, results):
+                if item_traced:
+                    future.batch_trace = trace
+                    future.queue_ms = (started - submitted) * 1000
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            done = time.perf_counter()
+            with self._lock:
+                self._batch_sizes.append(len(batch))
+                self._queue_delays_ms.extend(
+                    (started - entry[2]) * 1000 for entry in batch
+                )
+                self._batch_ms.append((done - started) * 1000)
+                self._requests += len(batch)
+                self._last_done = done
+
+    def stats(self) -> dict:
+        """Queueing delay versus throughput, over the recent batches."""
+        with self._lock:
+            if not self._batch_sizes:
+                return {"requests": 0, "batches": 0}
+            delays = np.array(self._queue_delays_ms)
+            return {
+                "requests": self._requests,
+                "batches": len(self._batch_sizes),
+                "mean_batch_size": float(np.mean(self._batch_sizes)),
+                "mean_queue_delay_ms": float(delays.mean()),
+                "p95_queue_delay_ms": float(np.percentile(delays, 95)),
+                "mean_batch_ms": float(np.mean(self._batch_ms)),
+                "throughput_per_s": self._requests
+                / max(self._last_done - self._first_submit, 1e-9),
+            }
+
+
+def _process_search_batch(requests: list) -> list:
+    """
+    Runs queued (query, top_n, search_mode, filters) requests: one embedding
+    round and one batched scoring pass per distinct set of search options.
+    """
+    groups = {}
+    for position, (_, top_n, search_mode, filters) in enumerate(requests):
+        key = (top_n, search_mode, json.dumps(filters, sort_keys=True, default=str))
+        groups.setdefault(key, []).append(position)
+    results = [None] * len(requests)
+    for positions in groups.values():
+        _, top_n, search_mode, filters = requests[positions[0]]
+        try:
+            found = _search_similar_arguments(
+                [requests[p][0] for p in positions], top_n, search_mode, filters
+            )
+        except Exception as e:
+            found = [e] * len(positions)
+        for position, result in zip(positions, found):
+            results[position] = result
+    return results
+
+
+# Queries from concurrent sessions arriving within SEARCH_BATCH_MAX_WAIT_MS of
+# each other (up to SEARCH_BATCH_MAX_SIZE) are embedded and scored together.
+# A longer wait forms bigger batches at the cost of added latency; compare
+# queueing delay and throughput with search_batcher.stats(). Both knobs can
+# also be tuned live via search_batcher.max_batch_size / .max_wait_ms.
+SEARCH_BATCH_MAX_SIZE = 32
+SEARCH_BATCH_MAX_WAIT_MS = 10.0
+search_batcher = MicroBatcher(
+    _process_search_batch, SEARCH_BATCH_MAX_SIZE, SEARCH_BATCH_MAX_WAIT_MS
+)
+
+
+def _graft_batch_traces(futures, search_span):
+    """Copies the shared batches' spans into the caller's trace, once per batch."""
+    current = tracing.current_trace()
+    if current is None:
+        return
+    batch_traces = {}
+    for future in futures:
+        batch_trace = getattr(future, "batch_trace", None)
+        if batch_trace is not None:
+            batch_traces[id(batch_trace)] = batch_trace
+    for batch_trace in batch_traces.values():
+        current.graft(batch_trace.spans)
+        for name, n in batch_trace.counters.items():
+            current.count(name, n)
+    search_span.set(
+        batches=len(batch_traces),
+        max_queue_ms=round(max((f.queue_ms for f in futures), default=0.0), 2),
+    )
+
+
+def search_similar_arguments(
+    query_texts: list,
+    top_n: int = 5,
+    search_mode: str = SEARCH_MODE,
+    filters: dict = None,
+) -> list:
+    """
+    Finds the top-N precedents for each query. Queries go through the shared
+    micro-batcher, so they are embedded and scored in a single matrix product
+    together with any other session's queries arriving at the same time.
+
+    Args:
+        query_texts: Argument texts to search for.
+        top_n: Number of precedents per query.
+        search_mode: "exact", "ivf", "int8", "binary", "truncated", "lexical"
+            or "hybrid"; "ivf", "int8", "binary" and "truncated" fall back to
+            exact search when their index is not built. Without the embedding
+            model (e.g. Vertex AI unreachable), every mode runs as "lexical",
+            and "hybrid" also does so if embedding the queries fails.
+        filters: Optional metadata filter, column -> value or list of values,
+            over party, document_type, court_followed (outcome) and case_title,
+            e.g. {"court_followed": ["Yes", "Partial/Deferred"]}. Only matching
+            rows are scored, so top-N is filled from them whenever possible.
+
+    Returns:
+        One PrecedentResults per query, in input order. `similarity_score` is
+        the BM25 score for lexical results and cosine similarity otherwise.
+        Empty queries get empty results; if search fails, every entry carries
+        the error.
+    """
+    try:
+        non_empty = [i for i, text in enumerate(query_texts) if text and text.strip()]
+        results = [PrecedentResults.empty() for _ in query_texts]
+        with tracing.span("search", queries=len(non_empty)) as search_span:
+            futures = {
+                i: search_batcher.submit((query_texts[i], top_n, search_mode, filters))
+                for i in non_empty
+            }
+            for i, future in futures.items():
+                results[i] = future.result()
+            _graft_batch_traces(futures.values(), search_span)
+        return results
+    except ResourceUnavailable as e:
+        return [PrecedentResults.empty(str(e)) for _ in query_texts]
     except Exception as e:
+        error = f"An unexpected error occurred during search: {str(e)}"
+        return [PrecedentResults.empty(error) for _ in query_texts]
+
+
+def get_similar_arguments_as_json(
+    query_text: str,
+    top_n: int = 5,
+    search_mode: str = SEARCH_MODE,
+    filters: dict = None,
+) -> str:
+    """JSON string form of a single-query search, for external callers."""
+    if not query_text.strip():
         return json.dumps(
-            {"error": f"An unexpected error occurred during search: {str(e)}"}, indent=4
+            [{"error": "Query is empty. Cannot perform search."}],
+            indent=4,
         )
+    results = search_similar_arguments([query_text], top_n, search_mode, filters)
+    with tracing.span("serialize_json") as json_span:
+        payload = results[0].to_json()
+        json_span.set(bytes=len(payload))
+    return payload
+
+
+def get_similar_arguments_batch_as_json(
+    query_texts: list,
+    top_n: int = 5,
+    search_mode: str = SEARCH_MODE,
+    filters: dict = None,
+) -> str:
+    """JSON string form of search_similar_arguments: one result list per query."""
+    results = search_similar_arguments(query_texts, top_n, search_mode, filters)
+    errors = [result.error for result in results if result.error]
+    if errors:
+        return json.dumps({"error": errors[0]}, indent=4)
+    return json.dumps([result.to_records() for result in results], indent=4)